@@ -2,8 +2,8 @@
 Alembic environment configuration for async migrations.
 """
 import asyncio
+import importlib
 from logging.config import fileConfig
-from urllib.parse import quote_plus
 import os
 import sys
 
@@ -11,19 +11,15 @@ from sqlalchemy import pool
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+# Load environment variables (once per process)
+if not os.getenv("ALEMBIC_ENV_LOADED"):
+    from dotenv import load_dotenv
+    load_dotenv()
+    os.environ["ALEMBIC_ENV_LOADED"] = "1"
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-# Import Base from app/db.py (this is the file, not the folder)
-from app.db import Base
-
-# Import all models so they register with Base.metadata
-from app.models_db.db_models import OnboardingSession, UserProfile
-
 # this is the Alembic Config object
 config = context.config
 
@@ -31,19 +27,30 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# Set target_metadata to your Base.metadata
-target_metadata = Base.metadata
-
-# Build database URL from environment variables
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "postgres")
 
-# URL-encode password to handle special characters
-encoded_password = quote_plus(DB_PASSWORD)
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+def _load_target_metadata():
+    """
+    Import the models only when autogenerate needs to diff against them.
+    upgrade/downgrade run the revision scripts and don't touch the metadata,
+    so they skip importing app.db (and building its engine) entirely.
+    """
+    opts = config.cmd_opts
+    # cmd_opts is None when driven through alembic.command from Python;
+    # we can't tell what is running then, so keep the metadata available
+    if opts is not None:
+        command_name = opts.cmd[0].__name__
+        if not getattr(opts, "autogenerate", False) and command_name != "check":
+            return None
+    # Importing the models module registers every table with Base.metadata
+    models = importlib.import_module("app.models_db.db_models")
+    return models.Base.metadata
+
+
+target_metadata = _load_target_metadata()
+
+# Database URL is built once in app/core/config.py
+from app.core.config import settings
+DATABASE_URL = settings.DATABASE_URL
 
 # Set the database URL in config (escape % for configparser)
 config.set_main_option("sqlalchemy.url", DATABASE_URL.replace('%', '%%'))
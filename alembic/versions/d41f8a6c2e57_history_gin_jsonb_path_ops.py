@@ -0,0 +1,31 @@
+"""Use jsonb_path_ops for the conversation_history GIN index
+
+Revision ID: d41f8a6c2e57
+Revises: b7c2e4a91f30
+Create Date: 2026-10-15 01:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f8a6c2e57'
+down_revision: Union[str, Sequence[str], None] = 'b7c2e4a91f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # jsonb_path_ops only serves @>, but is smaller and faster for it than the default opclass
+    op.drop_index('ix_onboarding_sessions_history_gin', table_name='onboarding_sessions', postgresql_using='gin')
+    op.create_index('ix_onboarding_sessions_history_gin', 'onboarding_sessions', ['conversation_history'], unique=False, postgresql_using='gin', postgresql_ops={'conversation_history': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_onboarding_sessions_history_gin', table_name='onboarding_sessions', postgresql_using='gin', postgresql_ops={'conversation_history': 'jsonb_path_ops'})
+    op.create_index('ix_onboarding_sessions_history_gin', 'onboarding_sessions', ['conversation_history'], unique=False, postgresql_using='gin')
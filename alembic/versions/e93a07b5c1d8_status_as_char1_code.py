@@ -0,0 +1,45 @@
+"""Store session status as a one-letter code
+
+Revision ID: e93a07b5c1d8
+Revises: d41f8a6c2e57
+Create Date: 2026-10-15 01:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93a07b5c1d8'
+down_revision: Union[str, Sequence[str], None] = 'd41f8a6c2e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The old ENUM stored member names ('IN_PROGRESS' / 'COMPLETED')
+    op.alter_column(
+        'onboarding_sessions', 'status',
+        existing_type=postgresql.ENUM('IN_PROGRESS', 'COMPLETED', name='sessionstatusenum'),
+        type_=sa.String(length=1),
+        existing_nullable=False,
+        postgresql_using="CASE status::text WHEN 'COMPLETED' THEN 'C' ELSE 'P' END",
+    )
+    postgresql.ENUM(name='sessionstatusenum').drop(op.get_bind(), checkfirst=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    status_enum = postgresql.ENUM('IN_PROGRESS', 'COMPLETED', name='sessionstatusenum')
+    status_enum.create(op.get_bind(), checkfirst=False)
+    op.alter_column(
+        'onboarding_sessions', 'status',
+        existing_type=sa.String(length=1),
+        type_=status_enum,
+        existing_nullable=False,
+        postgresql_using="(CASE status WHEN 'C' THEN 'COMPLETED' ELSE 'IN_PROGRESS' END)::sessionstatusenum",
+    )
@@ -0,0 +1,183 @@
+"""
+Bulk message processing for offline workflows (replays, backfills, test runs).
+OpenAI goes through its Batch API (about half the price, results within
+24h); other providers run the normal call path with bounded concurrency.
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+import orjson
+
+from app import services
+from app.models import SessionData
+from app.questions import get_missing_fields
+from app.logging_config import get_logger
+
+logger = get_logger("app.batch")
+
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+_CHAT_ENDPOINT = "/v1/chat/completions"
+
+# Batch states after which the job makes no more progress
+_TERMINAL_STATES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+class BatchProcessor:
+    """
+    Runs process_message over many (session, message) pairs.
+
+    Results come back in input order, and each session's profile is updated
+    the same way process_message would update it. Sessions are not saved:
+    persisting them is up to the caller.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[str] = None,
+        max_concurrency: int = 10,
+        poll_interval: float = 30.0
+    ):
+        # Fails fast on an unknown provider
+        self.provider = services.resolve_provider(provider)
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+
+    async def run(self, items: list[tuple[SessionData, str]]) -> list[dict]:
+        """Process every (session, user_message) pair."""
+        if self.provider == "openai":
+            return await self._run_openai_batch(items)
+        return await self._run_concurrent(items)
+
+    # === CONCURRENT FALLBACK ===
+
+    async def _run_concurrent(self, items: list[tuple[SessionData, str]]) -> list[dict]:
+        # Provider rate budgets and bulkheads still apply inside call_llm
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def one(session: SessionData, user_message: str) -> dict:
+            async with semaphore:
+                return await services.process_message(session, user_message, self.provider)
+
+        return await asyncio.gather(*(one(s, m) for s, m in items))
+
+    # === OPENAI BATCH API ===
+
+    async def _run_openai_batch(self, items: list[tuple[SessionData, str]]) -> list[dict]:
+        results: list[Optional[dict]] = [None] * len(items)
+        lines = []
+        for i, (session, user_message) in enumerate(items):
+            # Complete profiles get the fixed answer without an LLM call
+            if not get_missing_fields(session.profile):
+                results[i] = await services.process_message(session, user_message, self.provider)
+                continue
+            lines.append(self._request_line(i, services.build_llm_history(session, user_message)))
+
+        if lines:
+            replies = await self._submit_and_wait(b"\n".join(lines) + b"\n")
+            for i, (session, _) in enumerate(items):
+                if results[i] is None:
+                    llm_response = replies.get(str(i)) or services.fallback_response(
+                        "We're having trouble connecting. Could you try that again?"
+                    )
+                    results[i] = services.apply_llm_result(session, llm_response)
+
+        return results
+
+    @staticmethod
+    def _request_line(index: int, conversation_history: list[dict]) -> bytes:
+        """One JSONL request; reuses the prebuilt system-message bytes."""
+        body = services.splice_json(
+            {
+                "model": services.OPENAI_MODEL,
+                "temperature": services.BASE_TEMPERATURE,
+                "max_tokens": 500,
+                "response_format": {"type": "json_object"}
+            },
+            "messages",
+            services.chat_messages_json(conversation_history)
+        )
+        return services.splice_json(
+            {"custom_id": str(index), "method": "POST", "url": _CHAT_ENDPOINT},
+            "body",
+            body
+        )
+
+    async def _submit_and_wait(self, jsonl: bytes) -> dict[str, dict]:
+        """Upload, create and poll the batch; returns validated replies by custom_id."""
+        client = services.get_http_client()
+        auth = {"Authorization": f"Bearer {services.OPENAI_API_KEY}"}
+
+        upload = await client.post(
+            f"{OPENAI_BASE_URL}/files",
+            headers=auth,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", jsonl, "application/jsonl")}
+        )
+        upload.raise_for_status()
+
+        created = await client.post(
+            f"{OPENAI_BASE_URL}/batches",
+            headers=services.OPENAI_HEADERS,
+            content=orjson.dumps({
+                "input_file_id": orjson.loads(upload.content)["id"],
+                "endpoint": _CHAT_ENDPOINT,
+                "completion_window": "24h"
+            })
+        )
+        created.raise_for_status()
+        batch = orjson.loads(created.content)
+        logger.info("Submitted OpenAI batch %s", batch["id"])
+
+        while batch["status"] not in _TERMINAL_STATES:
+            await asyncio.sleep(self.poll_interval)
+            polled = await client.get(f"{OPENAI_BASE_URL}/batches/{batch['id']}", headers=auth)
+            polled.raise_for_status()
+            batch = orjson.loads(polled.content)
+
+        logger.info("OpenAI batch %s finished: %s", batch["id"], batch["status"])
+        if batch["status"] == "failed":
+            raise RuntimeError(f"OpenAI batch {batch['id']} failed: {batch.get('errors')}")
+
+        # Expired/cancelled batches can still carry partial output
+        if not batch.get("output_file_id"):
+            return {}
+        output = await client.get(
+            f"{OPENAI_BASE_URL}/files/{batch['output_file_id']}/content",
+            headers=auth
+        )
+        output.raise_for_status()
+        return self._parse_output(output.content)
+
+    @staticmethod
+    def _parse_output(content: bytes) -> dict[str, dict]:
+        replies = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                logger.warning("Batch request %s failed: %s", record.get("custom_id"), record.get("error"))
+                continue
+            try:
+                text = response["body"]["choices"][0]["message"]["content"]
+                replies[record["custom_id"]] = services.validate_llm_response(text)
+            except (KeyError, IndexError, ValueError) as e:
+                logger.warning("Batch reply %s unusable: %s", record.get("custom_id"), e)
+        return replies
+
+
+async def process_messages_batch(
+    sessions_and_msgs: list[tuple[SessionData, str]],
+    provider: Optional[str] = None
+) -> list[dict]:
+    """Process many (session, user_message) pairs; see BatchProcessor."""
+    processor = BatchProcessor(
+        provider,
+        max_concurrency=int(os.getenv("BATCH_MAX_CONCURRENCY", "10")),
+        poll_interval=float(os.getenv("BATCH_POLL_SECONDS", "30"))
+    )
+    return await processor.run(sessions_and_msgs)
@@ -1,25 +1,147 @@
 """
-In-memory session manager for onboarding sessions.
-This is a temporary implementation before database integration.
+Session manager for onboarding sessions.
+Sessions live in a pluggable async key-value store: Redis in production,
+an in-process dict for tests and local runs.
 """
 
-from typing import Dict, Optional
-from datetime import datetime
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Protocol
+from datetime import datetime, timezone
 import uuid
 
+import orjson
+
+from app.core.config import settings
 from app.models import SessionData, SessionStatus, UserProfile
+from app.logging_config import get_logger
 
+logger = get_logger("app.database")
 
-class SessionManager:
+
+# === STORE BACKENDS ===
+
+class SessionStore(Protocol):
+    """
+    Async key-value store used by SessionManager.
+    Values are opaque bytes; list keys hold the append-only history.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes) -> None: ...
+
+    async def delete(self, *keys: str) -> int: ...
+
+    def scan(self, prefix: str) -> AsyncIterator[str]: ...
+
+    async def append(self, key: str, value: bytes) -> None: ...
+
+    async def get_list(self, key: str) -> List[bytes]: ...
+
+
+class DictStore:
     """
-    In-memory session storage.
-    Stores active onboarding sessions in a dictionary.
+    In-process store backed by plain dicts.
+    Not shared across workers - use RedisStore for that.
     """
 
     def __init__(self):
-        self._sessions: Dict[str, SessionData] = {}
+        self._values: Dict[str, bytes] = {}
+        self._lists: Dict[str, List[bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._values.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._values[key] = value
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._values.pop(key, None) is not None:
+                deleted += 1
+            if self._lists.pop(key, None) is not None:
+                deleted += 1
+        return deleted
+
+    async def scan(self, prefix: str) -> AsyncIterator[str]:
+        # Iterate over a snapshot so concurrent set/delete can't break the scan
+        for key in [*self._values, *self._lists]:
+            if key.startswith(prefix):
+                yield key
+
+    async def append(self, key: str, value: bytes) -> None:
+        self._lists.setdefault(key, []).append(value)
+
+    async def get_list(self, key: str) -> List[bytes]:
+        return list(self._lists.get(key, ()))
+
+
+class RedisStore:
+    """
+    Redis-backed store (redis.asyncio client).
+    History appends are a single RPUSH, so the session record is never rewritten per message.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self._client.set(key, value)
 
-    def create_session(self, user_id: str) -> SessionData:
+    async def delete(self, *keys: str) -> int:
+        return await self._client.delete(*keys)
+
+    async def scan(self, prefix: str) -> AsyncIterator[str]:
+        async for key in self._client.scan_iter(match=f"{prefix}*"):
+            yield key.decode() if isinstance(key, bytes) else key
+
+    async def append(self, key: str, value: bytes) -> None:
+        await self._client.rpush(key, value)
+
+    async def get_list(self, key: str) -> List[bytes]:
+        return await self._client.lrange(key, 0, -1)
+
+
+def _build_store() -> SessionStore:
+    """Pick the store from settings: Redis when REDIS_URL is set, else in-process."""
+    if settings.REDIS_URL:
+        import redis.asyncio as aioredis
+        return RedisStore(aioredis.from_url(settings.REDIS_URL))
+    return DictStore()
+
+
+# === SESSION MANAGER ===
+
+_KEY_PREFIX = "sess:"
+
+
+def _session_key(session_id: str) -> str:
+    return f"{_KEY_PREFIX}{session_id}"
+
+
+def _history_key(session_id: str) -> str:
+    return f"{_KEY_PREFIX}{session_id}:history"
+
+
+class SessionManager:
+    """
+    Session storage on top of a SessionStore.
+    The session record (profile, status, ...) and its conversation history
+    are stored under separate keys so adding a message is a single append.
+    """
+
+    def __init__(self, store: Optional[SessionStore] = None):
+        self._store = store if store is not None else DictStore()
+
+    async def _save_record(self, session: SessionData) -> None:
+        record = session.model_dump(mode="json", exclude={"conversation_history"})
+        await self._store.set(_session_key(session.session_id), orjson.dumps(record))
+
+    async def create_session(self, user_id: str) -> SessionData:
         """
         Create a new onboarding session.
 
@@ -40,12 +162,12 @@ class SessionManager:
             conversation_history=[]
         )
 
-        self._sessions[session_id] = session
-        print(f"✅ Created new session: {session_id} for user: {user_id}")
+        await self._save_record(session)
+        logger.debug("Created new session: %s for user: %s", session_id, user_id)
 
         return session
 
-    def get_session(self, session_id: str) -> Optional[SessionData]:
+    async def get_session(self, session_id: str) -> Optional[SessionData]:
         """
         Retrieve a session by ID.
 
@@ -55,18 +177,28 @@ class SessionManager:
         Returns:
             SessionData or None if not found
         """
-        return self._sessions.get(session_id)
+        raw = await self._store.get(_session_key(session_id))
+        if raw is None:
+            return None
+
+        record = orjson.loads(raw)
+        record["conversation_history"] = [
+            orjson.loads(item)
+            for item in await self._store.get_list(_history_key(session_id))
+        ]
+        return SessionData.model_validate(record)
 
-    def update_session(self, session: SessionData) -> None:
+    async def update_session(self, session: SessionData) -> None:
         """
         Update an existing session.
+        Conversation history is append-only - use add_message for it.
 
         Args:
             session: The session object to update
         """
-        self._sessions[session.session_id] = session
+        await self._save_record(session)
 
-    def add_message(
+    async def add_message(
         self,
         session_id: str,
         role: str,
@@ -80,30 +212,31 @@ class SessionManager:
             role: Message role ("user" or "assistant")
             content: Message content
         """
-        session = self.get_session(session_id)
-        if session:
-            message = {
-                "role": role,
-                "content": content,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            session.conversation_history.append(message)
-            self.update_session(session)
+        # Unknown sessions get nothing - an orphan history list would never expire
+        if await self._store.get(_session_key(session_id)) is None:
+            return
+
+        message = {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now(timezone.utc)  # orjson writes ISO-8601
+        }
+        await self._store.append(_history_key(session_id), orjson.dumps(message))
 
-    def mark_complete(self, session_id: str) -> None:
+    async def mark_complete(self, session_id: str) -> None:
         """
         Mark a session as completed.
 
         Args:
             session_id: The session ID
         """
-        session = self.get_session(session_id)
+        session = await self.get_session(session_id)
         if session:
             session.status = SessionStatus.COMPLETED
-            self.update_session(session)
-            print(f"✅ Session completed: {session_id}")
+            await self.update_session(session)
+            logger.debug("Session completed: %s", session_id)
 
-    def delete_session(self, session_id: str) -> bool:
+    async def delete_session(self, session_id: str) -> bool:
         """
         Delete a session.
 
@@ -113,29 +246,47 @@ class SessionManager:
         Returns:
             bool: True if deleted, False if not found
         """
-        if session_id in self._sessions:
-            del self._sessions[session_id]
-            print(f"🗑️  Deleted session: {session_id}")
+        deleted = await self._store.delete(_session_key(session_id), _history_key(session_id))
+        if deleted:
+            logger.debug("Deleted session: %s", session_id)
             return True
         return False
 
-    def get_all_sessions(self) -> Dict[str, SessionData]:
+    async def get_all_sessions(self) -> Mapping[str, SessionData]:
         """
         Get all sessions (for debugging).
 
         Returns:
-            Dict of all sessions
+            Read-only mapping of all sessions (a snapshot, not live storage)
         """
-        return self._sessions
+        sessions = {}
+        async for key in self._store.scan(_KEY_PREFIX):
+            if key.endswith(":history"):
+                continue
+            session_id = key[len(_KEY_PREFIX):]
+            session = await self.get_session(session_id)
+            if session:
+                sessions[session_id] = session
+        return MappingProxyType(sessions)
 
-    def clear_all(self) -> None:
+    async def clear_all(self) -> None:
         """
         Clear all sessions (for testing/cleanup).
         """
-        count = len(self._sessions)
-        self._sessions.clear()
-        print(f"🗑️  Cleared {count} sessions")
+        keys = [key async for key in self._store.scan(_KEY_PREFIX)]
+        count = sum(1 for key in keys if not key.endswith(":history"))
+        if keys:
+            await self._store.delete(*keys)
+        logger.debug("Cleared %d sessions", count)
 
 
 # Global instance
-session_manager = SessionManager()
+session_manager = SessionManager(_build_store())
+
+
+def get_session_manager() -> SessionManager:
+    """
+    FastAPI dependency for the session manager.
+    Tests can override it with SessionManager(DictStore()).
+    """
+    return session_manager
@@ -161,120 +161,232 @@ Simple database operations for onboarding sessions.
 All CRUD operations for sessions and profiles.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update, func, literal, literal_column, bindparam, cast, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import joinedload
+from sqlalchemy import inspect as sa_inspect
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
 
-from app.models_db.db_models import OnboardingSession, UserProfile, SessionStatusEnum
+from app.models_db.db_models import (
+    OnboardingSession,
+    UserProfile,
+    SessionStatusEnum,
+    ACTIVE_SESSION_CLAUSE,
+)
+from app.questions import FIELD_ORDER
 from app.logging_config import get_logger
 
 # Get logger
 logger = get_logger("app.db_operations")
 
+# Fallback for rows whose history is NULL (column is NOT NULL, but be defensive)
+_EMPTY_JSONB_ARRAY = literal_column("'[]'::jsonb")
+
+# Profile columns the LLM may fill in
+_PROFILE_FIELDS = frozenset(FIELD_ORDER)
+
+# === PREBUILT STATEMENTS ===
+# Built once at import; the session id is bound per call as "sid".
+# Reusing the same statement objects also keeps SQLAlchemy's compiled cache hot.
+
+# Profile is 1:1, so join it in: one round-trip instead of selectinload's two
+_PROFILE_JOINED = (joinedload(OnboardingSession.profile),)
+
+_SELECT_SESSION_WITH_PROFILE = (
+    select(OnboardingSession)
+    .options(*_PROFILE_JOINED)
+    .where(OnboardingSession.session_id == bindparam("sid"))
+)
+
+# Only in-progress sessions: a completed one is never shipped with its history
+_SELECT_ACTIVE_SESSION_WITH_PROFILE = (
+    select(OnboardingSession)
+    .options(*_PROFILE_JOINED)
+    .where(
+        OnboardingSession.session_id == bindparam("sid"),
+        OnboardingSession.status == SessionStatusEnum.IN_PROGRESS
+    )
+)
+
+_SELECT_SESSION_STATUS = (
+    select(OnboardingSession.status)
+    .where(OnboardingSession.session_id == bindparam("sid"))
+)
+
+# Cheap freshness check for a cached session: its history length, in progress only
+_SELECT_ACTIVE_HISTORY_LENGTH = (
+    select(func.jsonb_array_length(OnboardingSession.conversation_history))
+    .where(
+        OnboardingSession.session_id == bindparam("sid"),
+        OnboardingSession.status == SessionStatusEnum.IN_PROGRESS
+    )
+)
+
+_SELECT_PROFILE = (
+    select(UserProfile)
+    .where(UserProfile.session_id == bindparam("sid"))
+)
+
+# Read-only view for the session endpoint: plain columns, no ORM objects, and
+# the history as JSON text so it can be passed through without a decode
+_SELECT_SESSION_VIEW = (
+    select(
+        OnboardingSession.session_id,
+        OnboardingSession.user_id,
+        OnboardingSession.status,
+        OnboardingSession.created_at,
+        cast(OnboardingSession.conversation_history, Text).label("history_json"),
+        *(getattr(UserProfile, field) for field in FIELD_ORDER),
+    )
+    .outerjoin(UserProfile, UserProfile.session_id == OnboardingSession.session_id)
+    .where(OnboardingSession.session_id == bindparam("sid"))
+)
+
 async def create_session(db: AsyncSession, user_id: str) -> OnboardingSession:
     """Create a new onboarding session with empty profile."""
     try:
         session_id = uuid.uuid4()
-        logger.info(f"Generated session_id: {session_id}")
+        logger.debug("Generated session_id: %s", session_id)
+
+        # One stamp for both rows (columns are naive UTC DateTime)
+        now = datetime.utcnow()
 
         # Create session
         session = OnboardingSession(
             session_id=session_id,
             user_id=user_id,
             status=SessionStatusEnum.IN_PROGRESS,
-            created_at=datetime.utcnow(),
+            created_at=now,
             conversation_history=[]
         )
-        logger.info("Created OnboardingSession object")
 
         # Create empty profile
         profile = UserProfile(
             profile_id=uuid.uuid4(),
             session_id=session_id,
             user_id=user_id,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+            created_at=now,
+            updated_at=now
         )
-        logger.info("Created UserProfile object")
 
         db.add(session)
         db.add(profile)
-        logger.info("Added objects to session")
 
         await db.commit()
-        logger.info("Committed to database")
 
         # Reload session with profile relationship
-        logger.info("Reloading session with profile...")
-        result = await db.execute(
-            select(OnboardingSession)
-            .options(selectinload(OnboardingSession.profile))
-            .where(OnboardingSession.session_id == session_id)
-        )
+        result = await db.execute(_SELECT_SESSION_WITH_PROFILE, {"sid": session_id})
         session = result.scalar_one()
-        logger.info(f"Session reloaded. Profile loaded: {session.profile is not None}")
-        logger.info(f"Created session: {session.session_id} for user: {user_id}")
+        logger.debug("Created session: %s for user: %s", session.session_id, user_id)
         
         return session
 
-    except Exception as e:
-        logger.error(f"ERROR in create_session: {type(e).__name__}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+    except Exception:
+        logger.exception("ERROR in create_session")
         raise
 
 
-async def get_session(db: AsyncSession, session_id: uuid.UUID) -> OnboardingSession | None:
+async def get_session_light(db: AsyncSession, session_id: uuid.UUID) -> OnboardingSession | None:
+    """Get a session by ID without loading its profile."""
+    # Primary-key get: served from the identity map when already loaded
+    return await db.get(OnboardingSession, session_id)
+
+
+async def get_session_with_profile(db: AsyncSession, session_id: uuid.UUID) -> OnboardingSession | None:
     """Get a session by ID with its profile loaded."""
-    result = await db.execute(
-        select(OnboardingSession)
-        .options(selectinload(OnboardingSession.profile))
-        .where(OnboardingSession.session_id == session_id)
-    )
+    session = await db.get(OnboardingSession, session_id, options=_PROFILE_JOINED)
+    # An identity-map hit skips the options; lazy loads can't run under
+    # asyncio, so load the profile explicitly if it isn't there yet
+    if session is not None and "profile" in sa_inspect(session).unloaded:
+        await db.refresh(session, ["profile"])
+    return session
+
+
+async def get_active_session_with_profile(db: AsyncSession, session_id: uuid.UUID) -> OnboardingSession | None:
+    """
+    Get an in-progress session with its profile loaded.
+    None if it doesn't exist or is completed - see get_session_status.
+    """
+    result = await db.execute(_SELECT_ACTIVE_SESSION_WITH_PROFILE, {"sid": session_id})
     return result.scalar_one_or_none()
 
 
-async def add_message(db: AsyncSession, session_id: uuid.UUID, role: str, content: str):
-    """Add a message to conversation history."""
-    try:
-        logger.info(f"add_message called: session_id={session_id}, role={role}")
+async def get_session_status(db: AsyncSession, session_id: uuid.UUID) -> SessionStatusEnum | None:
+    """Just a session's status (index-only scan); None if it doesn't exist."""
+    result = await db.execute(_SELECT_SESSION_STATUS, {"sid": session_id})
+    return result.scalar_one_or_none()
 
-        session = await get_session(db, session_id)
-        if not session:
-            logger.error(f"ERROR: Session not found: {session_id}")
-            return
 
-        # Handle NoneType for conversation_history (Fixes the crash)
-        if session.conversation_history is None:
-            session.conversation_history = []
-            logger.warning("conversation_history was None, initialized to []")
+async def get_active_history_length(db: AsyncSession, session_id: uuid.UUID) -> int | None:
+    """
+    Number of messages in an in-progress session's history, computed in
+    Postgres; None if the session doesn't exist or is completed.
+    """
+    result = await db.execute(_SELECT_ACTIVE_HISTORY_LENGTH, {"sid": session_id})
+    return result.scalar_one_or_none()
 
-        logger.info(f"Session found. Current history length: {len(session.conversation_history)}")
 
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+async def get_session_view(db: AsyncSession, session_id: uuid.UUID):
+    """
+    One row with the session columns, its profile fields and the history
+    as raw JSON text (history_json); None if the session doesn't exist.
+    """
+    result = await db.execute(_SELECT_SESSION_VIEW, {"sid": session_id})
+    return result.first()
 
-        # Append message (Only once!)
-        session.conversation_history.append(message)
-        logger.info(f"Message appended. New history length: {len(session.conversation_history)}")
 
-        # Mark as modified for JSONB column
-        from sqlalchemy.orm.attributes import flag_modified
-        flag_modified(session, "conversation_history")
-        logger.info("Marked conversation_history as modified")
+async def add_message(db: AsyncSession, session_id: uuid.UUID, role: str, content: str):
+    """Add a message to conversation history."""
+    await add_messages(db, session_id, [(role, content)])
+
+
+async def add_messages(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    messages: list[tuple[str, str]]
+) -> list[dict] | None:
+    """
+    Append (role, content) messages to conversation history.
+    Returns the appended message dicts, or None if the session doesn't exist.
+
+    The append happens server-side (jsonb ||) in a single UPDATE, so the
+    existing history is neither read nor re-sent on each write. No ORM
+    object is mutated, so there is nothing to flag_modified().
+    """
+    try:
+        # One timezone-aware stamp per call, shared by all appended messages.
+        # Serialized to ISO-8601 by the engine's orjson serializer.
+        timestamp = datetime.now(timezone.utc)
+        new_messages = [
+            {"role": role, "content": content, "timestamp": timestamp}
+            for role, content in messages
+        ]
+
+        result = await db.execute(
+            update(OnboardingSession)
+            .where(OnboardingSession.session_id == session_id)
+            .values(
+                conversation_history=func.coalesce(
+                    OnboardingSession.conversation_history, _EMPTY_JSONB_ARRAY
+                ) + literal(new_messages, JSONB)
+            )
+            # History is never re-read from the identity map in the same request
+            .execution_options(synchronize_session=False)
+        )
+
+        if result.rowcount == 0:
+            logger.info("Session not found: %s", session_id)
+            await db.rollback()
+            return None
 
         await db.commit()
-        logger.info("Committed message to database")
+        logger.debug("added msgs session=%s count=%d", session_id, len(new_messages))
+        return new_messages
 
-    except Exception as e:
-        logger.error(f"ERROR in add_message: {type(e).__name__}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+    except Exception:
+        logger.exception("ERROR in add_messages")
         raise
 
 
@@ -285,43 +397,147 @@ async def update_profile(
 ):
     """Update profile fields for a session."""
     try:
-        result = await db.execute(
-            select(UserProfile).where(UserProfile.session_id == session_id)
-        )
+        result = await db.execute(_SELECT_PROFILE, {"sid": session_id})
         profile = result.scalar_one_or_none()
 
         if not profile:
-            logger.warning(f"UserProfile not found for session: {session_id}")
+            logger.info("UserProfile not found for session: %s", session_id)
             return
 
         # Update only provided fields
         for field, value in profile_fields.items():
             if hasattr(profile, field) and value is not None:
                 setattr(profile, field, value)
-                logger.info(f"Set {field} = {value}")
+                logger.debug("Set %s = %s", field, value)
 
         profile.updated_at = datetime.utcnow()
         await db.commit()
-        logger.info(f"Profile updated for session: {session_id}")
+        logger.debug("Profile updated for session: %s", session_id)
         
-    except Exception as e:
-        logger.error(f"ERROR in update_profile: {type(e).__name__}: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+    except Exception:
+        logger.exception("ERROR in update_profile")
         raise
 
 
 async def mark_complete(db: AsyncSession, session_id: uuid.UUID):
     """Mark a session as completed."""
     try:
-        session = await get_session(db, session_id)
-        if session:
-            session.status = SessionStatusEnum.COMPLETED
+        result = await db.execute(
+            update(OnboardingSession)
+            .where(OnboardingSession.session_id == session_id)
+            .values(status=SessionStatusEnum.COMPLETED)
+        )
+        if result.rowcount:
             await db.commit()
-            logger.info(f"Session completed: {session_id}")
+            logger.info("Session completed: %s", session_id)
         else:
-            logger.warning(f"Could not mark complete - session not found: {session_id}")
+            await db.rollback()
+            logger.info("Could not mark complete - session not found: %s", session_id)
             
-    except Exception as e:
-        logger.error(f"ERROR in mark_complete: {type(e).__name__}: {str(e)}")
+    except Exception:
+        logger.exception("ERROR in mark_complete")
         raise
+
+
+async def add_messages_and_update(
+    db: AsyncSession,
+    session_id: uuid.UUID,
+    messages: list[tuple[str, str]],
+    extracted: dict,
+    is_complete: bool = False
+) -> tuple[list[dict], UserProfile | None] | None:
+    """
+    Record one conversation turn in a single transaction: append the
+    messages (and mark the session complete if `is_complete`) in one
+    UPDATE, then update the profile with the `extracted` fields.
+
+    Returns (appended message dicts, profile) - the profile comes back from
+    UPDATE ... RETURNING (or a plain read when completing with nothing
+    extracted) and is None otherwise. Returns None if the session doesn't exist.
+    """
+    try:
+        timestamp = datetime.now(timezone.utc)
+        new_messages = [
+            {"role": role, "content": content, "timestamp": timestamp}
+            for role, content in messages
+        ]
+
+        session_values = {
+            "conversation_history": func.coalesce(
+                OnboardingSession.conversation_history, _EMPTY_JSONB_ARRAY
+            ) + literal(new_messages, JSONB)
+        }
+        if is_complete:
+            session_values["status"] = SessionStatusEnum.COMPLETED
+
+        result = await db.execute(
+            update(OnboardingSession)
+            .where(OnboardingSession.session_id == session_id)
+            .values(**session_values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            logger.info("Session not found: %s", session_id)
+            await db.rollback()
+            return None
+
+        profile = None
+        profile_values = {
+            field: value for field, value in extracted.items()
+            if field in _PROFILE_FIELDS and value is not None
+        }
+        if profile_values:
+            result = await db.execute(
+                update(UserProfile)
+                .where(UserProfile.session_id == session_id)
+                .values(**profile_values, updated_at=datetime.utcnow())
+                .returning(UserProfile)
+            )
+            profile = result.scalar_one_or_none()
+        elif is_complete:
+            result = await db.execute(_SELECT_PROFILE, {"sid": session_id})
+            profile = result.scalar_one_or_none()
+
+        await db.commit()
+        logger.debug(
+            "recorded turn session=%s msgs=%d fields=%d complete=%s",
+            session_id, len(new_messages), len(profile_values), is_complete
+        )
+        return new_messages, profile
+
+    except Exception:
+        logger.exception("ERROR in add_messages_and_update")
+        raise
+
+
+async def find_sessions_by_history(
+    db: AsyncSession,
+    message: dict,
+    limit: int = 50
+) -> list[OnboardingSession]:
+    """
+    Find sessions whose history contains a message matching `message`,
+    e.g. {"role": "user", "content": "Remote"}.
+
+    Uses jsonb @> so it is served by the jsonb_path_ops GIN index.
+    """
+    result = await db.execute(
+        select(OnboardingSession)
+        .where(OnboardingSession.conversation_history.contains([message]))
+        .limit(limit)
+    )
+    return list(result.scalars())
+
+
+async def get_active_session(db: AsyncSession, user_id: str) -> OnboardingSession | None:
+    """
+    Get the user's most recent in-progress session (for resuming), if any.
+    Served by the ix_onboarding_sessions_active partial index.
+    """
+    result = await db.execute(
+        select(OnboardingSession)
+        .where(OnboardingSession.user_id == user_id, ACTIVE_SESSION_CLAUSE)
+        .order_by(OnboardingSession.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
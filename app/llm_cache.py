@@ -0,0 +1,142 @@
+"""
+Exact-match cache for LLM replies.
+Keyed on a hash of everything that shapes the request (provider, model,
+messages, temperature), so an identical conversation reuses the earlier
+reply instead of another provider round-trip. Message text is compared
+with whitespace collapsed; case is kept, since a cached reply's extracted
+values (names, free text) are returned verbatim.
+Backed by Redis when REDIS_URL is set, an in-process LRU otherwise.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+import orjson
+
+from app.core.config import settings
+from app.logging_config import get_logger
+
+logger = get_logger("app.llm_cache")
+
+
+# === BACKENDS ===
+
+class CacheBackend(Protocol):
+    """Async byte cache with per-entry TTL."""
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryBackend:
+    """In-process LRU with expiry. Not shared across workers."""
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisBackend:
+    """Redis-backed cache (redis.asyncio client), shared by all workers."""
+
+    def __init__(self, client, prefix: str = "llm:"):
+        self._client = client
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(self._prefix + key, value, ex=max(1, int(ttl)))
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+# === CACHE ===
+
+def _normalize(content: str) -> str:
+    """Collapse whitespace so "Remote  work " and "Remote work" share a key."""
+    return " ".join(content.split())
+
+
+def cache_key(provider: str, model: str, messages: list[dict], temperature: float) -> str:
+    """SHA-256 over the canonical (sorted-keys) JSON of the request inputs."""
+    payload = {
+        "provider": provider,
+        "model": model,
+        "messages": [
+            {"role": m["role"], "content": _normalize(m["content"])} for m in messages
+        ],
+        "temperature": temperature,
+    }
+    return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class LLMCache:
+    """
+    Stores validated LLM results (dicts) by cache_key.
+    Backend errors are logged and treated as a miss - the cache must never
+    fail a request.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self._backend = backend
+        self._ttl = ttl
+
+    async def get(self, key: str) -> Optional[dict]:
+        try:
+            raw = await self._backend.get(key)
+        except Exception as e:
+            logger.warning("LLM cache get failed: %s: %s", type(e).__name__, e)
+            return None
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, key: str, result: dict) -> None:
+        try:
+            await self._backend.set(key, orjson.dumps(result), self._ttl)
+        except Exception as e:
+            logger.warning("LLM cache set failed: %s: %s", type(e).__name__, e)
+
+    async def close(self) -> None:
+        try:
+            await self._backend.close()
+        except Exception as e:
+            logger.warning("LLM cache close failed: %s: %s", type(e).__name__, e)
+
+
+def build_llm_cache() -> Optional[LLMCache]:
+    """Pick the backend from settings; None when LLM_CACHE_TTL is 0."""
+    if settings.LLM_CACHE_TTL <= 0:
+        return None
+    if settings.REDIS_URL:
+        import redis.asyncio as aioredis
+        backend = RedisBackend(aioredis.from_url(settings.REDIS_URL))
+    else:
+        backend = MemoryBackend(settings.LLM_CACHE_MAXSIZE)
+    return LLMCache(backend, settings.LLM_CACHE_TTL)
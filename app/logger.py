@@ -1,22 +0,0 @@
-# app/logger_config.py
-import logging
-import sys
-
-def setup_logger(name):
-    logger = logging.getLogger(name)
-    
-    # Only add handler if not already added (prevents duplicate logs)
-    if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-    
-    # Ensure standard libraries also log
-    logging.getLogger("uvicorn").setLevel(logging.INFO)
-    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
-    
-    return logger
\ No newline at end of file
@@ -2,23 +2,62 @@
 Centralized logging configuration for the entire application.
 Ensures all loggers output to console with consistent formatting.
 """
+import atexit
+import functools
 import logging
+import logging.handlers
+import queue
 import sys
 
 
+# Our loggers ("app" covers every app.* module); they follow LOG_LEVEL
+_APP_LOGGERS = ("main", "app")
+
+# Third-party loggers pinned by configure_logging
+_LOGGER_LEVELS = (
+    ("sqlalchemy.engine", logging.WARNING),
+    ("sqlalchemy.pool", logging.WARNING),
+    ("uvicorn", logging.INFO),
+    ("uvicorn.access", logging.INFO),
+)
+
+# Background thread that does the actual console I/O
+_listener: logging.handlers.QueueListener | None = None
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched.
+    The stock prepare() formats message and traceback on the calling thread;
+    the queue never leaves the process, so leave that to the listener.
+    """
+
+    def prepare(self, record):
+        return record
+
+
 def configure_logging():
-    """Configure logging for the entire application."""
+    """
+    Configure logging for the entire application.
+
+    Log calls only enqueue the record; a QueueListener thread formats and
+    writes it to stdout, so a slow stdout never blocks the event loop.
+    """
+    global _listener
+    from app.core.config import settings
     
     # Create root logger
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
+    root_logger.setLevel(settings.log_level)
     
     # Remove any existing handlers to avoid duplicates
     root_logger.handlers.clear()
+    if _listener is not None:
+        _listener.stop()
     
-    # Create console handler with INFO level
+    # Create console handler at the configured level (LOG_LEVEL, default INFO)
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
+    console_handler.setLevel(settings.log_level)
     
     # Create formatter with timestamp and module name
     formatter = logging.Formatter(
@@ -27,25 +66,33 @@ def configure_logging():
     )
     
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+
+    # Route records through a queue to the console handler
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(_InProcessQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(
+        log_queue, console_handler, respect_handler_level=True
+    )
+    _listener.start()
     
     # Configure specific loggers
-    logging.getLogger("main").setLevel(logging.DEBUG)
-    logging.getLogger("app.db_operations").setLevel(logging.DEBUG)
-    logging.getLogger("app.services").setLevel(logging.DEBUG)
-    logging.getLogger("app.db").setLevel(logging.DEBUG)
-    
-    # SQLAlchemy logging - set to WARNING to reduce noise, but keep INFO for errors
-    logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
-    logging.getLogger("sqlalchemy.pool").setLevel(logging.WARNING)
-    
-    # Uvicorn logging
-    logging.getLogger("uvicorn").setLevel(logging.INFO)
-    logging.getLogger("uvicorn.access").setLevel(logging.INFO)
+    # SQLAlchemy at WARNING to reduce noise (errors still come through)
+    for name in _APP_LOGGERS:
+        logging.getLogger(name).setLevel(settings.log_level)
+    for name, level in _LOGGER_LEVELS:
+        logging.getLogger(name).setLevel(level)
     
     return root_logger
 
 
+@atexit.register
+def _stop_listener():
+    """Flush queued records on interpreter exit."""
+    if _listener is not None:
+        _listener.stop()
+
+
+@functools.cache
 def get_logger(name: str) -> logging.Logger:
-    """Get a logger with the given name."""
+    """Get a logger with the given name (cached - skips logging's module lock)."""
     return logging.getLogger(name)
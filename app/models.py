@@ -2,10 +2,11 @@
 Pydantic models for the onboarding API.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
+from uuid import UUID
 
 
 # === API REQUEST MODELS ===
@@ -17,7 +18,7 @@ class InitRequest(BaseModel):
 
 class AnswerRequest(BaseModel):
     """Request to submit an answer."""
-    session_id: str
+    session_id: UUID
     answer: str
 
 
@@ -28,12 +29,24 @@ class UserProfile(BaseModel):
     User profile data collected during onboarding.
     Fields match FIELD_ORDER in questions.py
     """
-    name: Optional[str] = None
-    role: Optional[str] = None
-    experience_level: Optional[str] = None
-    location: Optional[str] = None
-    startup_stage: Optional[str] = None
-    extra_preferences: Optional[str] = None
+    # Unknown keys are rejected outright instead of going through extra handling
+    model_config = ConfigDict(extra="forbid", validate_assignment=False)
+
+    # "" means "not collected yet" - keeps every field on the plain str path
+    name: str = ""
+    role: str = ""
+    experience_level: str = ""
+    location: str = ""
+    startup_stage: str = ""
+    extra_preferences: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def none_to_empty(cls, data):
+        """DB rows store missing fields as NULL; map them to ""."""
+        if isinstance(data, dict):
+            return {k: ("" if v is None else v) for k, v in data.items()}
+        return data
 
 
 class SessionStatus(str, Enum):
@@ -47,6 +60,8 @@ class SessionData(BaseModel):
     Full session state.
     Tracks everything about an onboarding conversation.
     """
+    model_config = ConfigDict(extra="forbid", validate_assignment=False)
+
     session_id: str
     user_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -57,7 +72,44 @@ class SessionData(BaseModel):
     
     # Conversation history
     # Format: [{"question": "...", "answer": "...", "timestamp": "..."}, ...]
-    conversation_history: List[Dict[str, Any]] = []
+    conversation_history: List[Dict[str, Any]] = Field(default_factory=list)
+
+
+# === LLM OUTPUT ===
+
+class LLMOutput(BaseModel):
+    """
+    JSON shape the system prompt asks the LLM to reply with.
+    Validated straight from the raw JSON text; extra keys are ignored.
+    """
+    response: str
+    extracted: Dict[str, str] = Field(default_factory=dict)
+    is_complete: bool = False
+
+    @field_validator("response")
+    @classmethod
+    def response_not_blank(cls, v):
+        if not v.strip():
+            raise ValueError("LLM returned empty 'response' field")
+        return v
+
+    @field_validator("extracted", mode="before")
+    @classmethod
+    def coerce_extracted(cls, v):
+        """
+        Profile columns are text: numbers become strings; booleans, null and
+        nested values are dropped before they reach the profile or the DB.
+        """
+        if v is None:
+            return {}
+        if not isinstance(v, dict):
+            return v  # not an object - let validation reject it
+        return {
+            key: value if isinstance(value, str) else str(value)
+            for key, value in v.items()
+            # bool is an int subclass - "True" is not a profile value
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool)
+        }
 
 
 # === API RESPONSE MODELS ===
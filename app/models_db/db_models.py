@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum as SQLEnum
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, Computed, text
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 import enum
@@ -15,6 +16,29 @@ class SessionStatusEnum(str, enum.Enum):
     COMPLETED = "completed"
 
 
+# Stored as a one-letter code instead of a Postgres ENUM type
+_STATUS_TO_CODE = {
+    SessionStatusEnum.IN_PROGRESS: "P",
+    SessionStatusEnum.COMPLETED: "C",
+}
+_CODE_TO_STATUS = {code: status for status, code in _STATUS_TO_CODE.items()}
+
+# Literal (not bound) so prepared statements can still match the partial index below
+ACTIVE_SESSION_CLAUSE = text("status = 'P'")
+
+
+class SessionStatusCode(TypeDecorator):
+    """SessionStatusEnum <-> CHAR(1) code ('P' / 'C') via plain dict lookups."""
+    impl = String(1)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else _STATUS_TO_CODE[value]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else _CODE_TO_STATUS[value]
+
+
 
 class OnboardingSession(Base):
     """
@@ -35,7 +59,7 @@ class OnboardingSession(Base):
 
     #session metadata
 
-    status = Column(SQLEnum(SessionStatusEnum), default=SessionStatusEnum.IN_PROGRESS, nullable=False)
+    status = Column(SessionStatusCode(), default=SessionStatusEnum.IN_PROGRESS, nullable=False)
     created_at = Column(DateTime,default=datetime.utcnow,nullable=False)
 
 
@@ -46,6 +70,25 @@ class OnboardingSession(Base):
     # Relationship to profile (1:1)
     profile = relationship("UserProfile", back_populates="session", uselist=False, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # GIN (jsonb_path_ops) index so @> containment queries on the history don't seq-scan
+        Index(
+            "ix_onboarding_sessions_history_gin",
+            conversation_history,
+            postgresql_using="gin",
+            postgresql_ops={"conversation_history": "jsonb_path_ops"},
+        ),
+        # Partial index for "latest in-progress session of this user"
+        Index(
+            "ix_onboarding_sessions_active",
+            user_id,
+            created_at.desc(),
+            postgresql_where=ACTIVE_SESSION_CLAUSE,
+        ),
+        # Covering index so a status lookup by id is an index-only scan
+        Index("ix_onboarding_sessions_status", session_id, status),
+    )
+
     def __repr__(self):
         return f"<OnboardingSession(session_id={self.session_id}, user_id={self.user_id}, status={self.status})>"
     
@@ -62,6 +105,7 @@ class UserProfile(Base):
     profile_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
     # Foreign Key to session (1:1 relationship)
+    # unique=True already gives the profile join its index
     session_id = Column(UUID(as_uuid=True), ForeignKey("onboarding_sessions.session_id", ondelete="CASCADE"), nullable=False, unique=True)
     
     # User identifier (same as in session)
@@ -73,7 +117,14 @@ class UserProfile(Base):
     experience_level = Column(String(100), nullable=True)
     location = Column(String(255), nullable=True)
     startup_stage = Column(String(100), nullable=True)
-    extra_preferences = Column(String(500), nullable=True)
+    extra_preferences = Column(Text, nullable=True)
+
+    # Full-text search vector over extra_preferences, maintained by Postgres.
+    # Deferred so normal profile loads don't fetch it.
+    extra_preferences_tsv = deferred(Column(
+        TSVECTOR,
+        Computed("to_tsvector('english', coalesce(extra_preferences, ''))", persisted=True),
+    ))
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -82,6 +133,10 @@ class UserProfile(Base):
     # Relationship back to session
     session = relationship("OnboardingSession", back_populates="profile")
 
+    __table_args__ = (
+        Index("ix_user_profiles_extra_preferences_tsv", extra_preferences_tsv, postgresql_using="gin"),
+    )
+
     def __repr__(self):
         return f"<UserProfile(profile_id={self.profile_id}, user_id={self.user_id}, name={self.name})>"
 
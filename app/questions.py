@@ -5,6 +5,7 @@ Defines WHAT we collect, not HOW we ask.
 
 from typing import Optional
 from enum import Enum
+from functools import lru_cache
 
 
 class FieldType(str, Enum):
@@ -69,6 +70,9 @@ FIELDS = {
 
 # Order in which fields should be collected
 FIELD_ORDER = ["name", "role", "experience_level", "location", "startup_stage", "extra_preferences"]
+_FIELD_ORDER_TUPLE = tuple(FIELD_ORDER)
+_FIELD_ORDER_SET = frozenset(FIELD_ORDER)
+_FIELD_POSITION = {name: i for i, name in enumerate(FIELD_ORDER)}
 
 # Completion messages (still hardcoded - these are our brand voice)
 COMPLETION = {
@@ -104,33 +108,25 @@ def get_field_order()->list[str]:
 
 
 def get_missing_fields(profile)->list[str]:
-    missing = []
-
-    for field_name in FIELD_ORDER:
-        field_config = FIELDS[field_name]
-        current_value = getattr(profile,field_name,None)
-    if current_value is None or current_value=="":
-
-            missing.append(field_name)
-        
-        
-
-    return missing
+    # Fields live in __dict__ on both pydantic models and loaded ORM rows;
+    # None and "" both count as missing
+    d = profile.__dict__
+    return [f for f in _FIELD_ORDER_TUPLE if not d.get(f)]
 
 
 def get_collected_field(profile)->dict:
-
-    collected = {}
-
-    for field_name in FIELD_ORDER:
-        current_value = getattr(profile,field_name,None)
-
-        if current_value is not None and current_value != "":
-            collected[field_name] = current_value
-
-    return collected
-
-
+    d = profile.__dict__
+    # Pydantic models track which fields were ever set; only look at those.
+    # ORM rows have no such bookkeeping, so fall back to every field.
+    fields_set = getattr(profile, "__pydantic_fields_set__", None)
+    if fields_set is None:
+        names = _FIELD_ORDER_TUPLE
+    else:
+        names = sorted(fields_set & _FIELD_ORDER_SET, key=_FIELD_POSITION.__getitem__)
+    return {f: v for f in names if (v := d.get(f))}
+
+
+@lru_cache(maxsize=1)
 def get_first_question()->str:
     return FIELDS["name"]["first_question"]
 
@@ -139,7 +135,7 @@ def get_first_question()->str:
 
 
 
-def build_fields_description() -> str:
+def _build_fields_description() -> str:
     """
     Build a description of all fields for the LLM prompt.
     """
@@ -167,7 +163,12 @@ def build_fields_description() -> str:
     return "\n".join(lines)
 
 
+# FIELDS/FIELD_ORDER are static, so the description is built once at import
+_FIELDS_DESCRIPTION = _build_fields_description()
 
 
-
-
+def build_fields_description() -> str:
+    """
+    Description of all fields for the LLM prompt (precomputed at import).
+    """
+    return _FIELDS_DESCRIPTION
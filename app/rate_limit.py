@@ -0,0 +1,40 @@
+"""
+Client-side rate limiting for outbound LLM calls.
+Throttles to a provider's requests/tokens-per-minute budget up front, so
+we wait locally instead of spending a round-trip on a 429.
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens every `period` seconds,
+    bursting up to `rate`. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, period: float = 60.0):
+        self._capacity = rate
+        self._tokens = rate
+        self._fill_rate = rate / period
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` tokens are available, then take them."""
+        # A request bigger than the whole bucket would never fit; let it
+        # through once the bucket is full
+        amount = min(amount, self._capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens + (now - self._updated) * self._fill_rate
+                )
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self._fill_rate)
@@ -5,14 +5,19 @@ LLM Service for onboarding.
 Supports: OpenAI (GPT-4o), DeepSeek
 """
 
-import json
 import os
+import re
+import random
+import sys
 import httpx
+import orjson
 import logging
 import asyncio
-from typing import Optional
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
-from app.models import SessionData, UserProfile
+from app.models import SessionData, UserProfile, LLMOutput
 from app.questions import (
     FIELDS,
     FIELD_ORDER,
@@ -20,7 +25,11 @@ from app.questions import (
     COMPLETION,
     build_fields_description,
     get_first_question,
+    get_missing_fields,
+    get_collected_field,
 )
+from app.llm_cache import LLMCache, build_llm_cache, cache_key
+from app.rate_limit import TokenBucket
 from app.logging_config import get_logger
 
 # === LOGGING SETUP ===
@@ -46,23 +55,145 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = "gemini-2.0-flash"
 GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
 
+# Only the last N history messages go to the LLM; older turns are replaced
+# by a summary of what has been extracted so far (0 = send everything)
+LLM_HISTORY_WINDOW = int(os.getenv("LLM_HISTORY_WINDOW", "8"))
+
 # Retry configuration
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 1
-
-logger.info(f"LLM Provider: {LLM_PROVIDER}")
-logger.info(f"OpenAI API Key: {'SET' if OPENAI_API_KEY else 'NOT SET'}")
-logger.info(f"Gemini API Key: {'SET' if GEMINI_API_KEY else 'NOT SET'}")
-logger.info(f"DeepSeek API Key: {'SET' if DEEPSEEK_API_KEY else 'NOT SET'}")
+# Ceiling for the exponential backoff, however many retries are configured
+MAX_RETRY_DELAY_SECONDS = 8
+
+# Deterministic failures - the same request will fail again, don't retry
+NON_RETRYABLE_STATUS = frozenset({400, 401, 403, 404, 422})
+# Statuses whose Retry-After header we honour (capped)
+RETRY_AFTER_STATUS = frozenset({429, 503})
+MAX_RETRY_AFTER_SECONDS = 30
+
+# Max in-flight requests per provider; excess calls wait locally instead
+# of piling onto the provider's rate limit
+LLM_MAX_CONCURRENCY = {
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", "20")),
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "30")),
+    "deepseek": int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "20")),
+}
+
+# Client-side rate budgets per provider (0, empty or unset = no limit):
+# requests and estimated tokens per minute
+LLM_RPM = {
+    "openai": int(os.getenv("OPENAI_RPM") or 0),
+    "gemini": int(os.getenv("GEMINI_RPM") or 0),
+    "deepseek": int(os.getenv("DEEPSEEK_RPM") or 0),
+}
+LLM_TPM = {
+    "openai": int(os.getenv("OPENAI_TPM") or 0),
+    "gemini": int(os.getenv("GEMINI_TPM") or 0),
+    "deepseek": int(os.getenv("DEEPSEEK_TPM") or 0),
+}
+
+# Shared HTTP client tuning (ops can override via env)
+HTTPX_MAX_CONN = int(os.getenv("HTTPX_MAX_CONN", "100"))
+HTTPX_MAX_KEEPALIVE = int(os.getenv("HTTPX_MAX_KEEPALIVE", "32"))
+HTTPX_KEEPALIVE_EXPIRY = float(os.getenv("HTTPX_KEEPALIVE_EXPIRY", "60"))
+HTTPX_HTTP2 = os.getenv("HTTPX_HTTP2", "1").lower() in ("1", "true", "yes")
+
+# Stream OpenAI/DeepSeek replies and stop reading once the JSON object is
+# complete, instead of waiting for the whole response body
+LLM_STREAM = os.getenv("LLM_STREAM", "1").lower() in ("1", "true", "yes")
+
+# Hedging: if the primary provider hasn't answered within the delay, also
+# send the call to a backup provider and take the first valid reply (extra
+# tokens only for slow calls, hides slow/stalled providers)
+HEDGE_LLM = os.getenv("HEDGE_LLM", "0").lower() in ("1", "true", "yes")
+HEDGE_DELAY_SECONDS = float(os.getenv("HEDGE_DELAY_SECONDS", "0.8"))
+
+# Static per-provider request headers (keys are read once at import)
+OPENAI_HEADERS = {
+    "Authorization": f"Bearer {OPENAI_API_KEY}",
+    "Content-Type": "application/json"
+}
+_DEEPSEEK_HEADERS = {
+    "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
+    "Content-Type": "application/json"
+}
+_GEMINI_HEADERS = {
+    "Content-Type": "application/json"
+}
+_GEMINI_REQUEST_URL = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
+
+logger.info("LLM Provider: %s", LLM_PROVIDER)
+logger.info("OpenAI API Key: %s", "SET" if OPENAI_API_KEY else "NOT SET")
+logger.info("Gemini API Key: %s", "SET" if GEMINI_API_KEY else "NOT SET")
+logger.info("DeepSeek API Key: %s", "SET" if DEEPSEEK_API_KEY else "NOT SET")
+logger.info("LLM hedging: %s", "ON" if HEDGE_LLM else "OFF")
+
+
+# === HTTP CLIENT ===
+# One pooled client for all LLM calls, so connections (and TLS sessions)
+# are reused across requests instead of re-handshaking every call.
+# Opened/closed by the FastAPI lifespan; created on first use otherwise
+# (scripts, tests).
+
+_HTTP_CLIENT: httpx.AsyncClient | None = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install 'httpx[http2]')."""
+    if not HTTPX_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.info("h2 not installed - LLM client using HTTP/1.1")
+        return False
+    return True
+
+
+def _new_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTPX_MAX_CONN,
+            max_keepalive_connections=HTTPX_MAX_KEEPALIVE,
+            keepalive_expiry=HTTPX_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(30.0, connect=10.0),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client, created on first use."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        _HTTP_CLIENT = _new_http_client()
+    return _HTTP_CLIENT
+
+
+async def init_http_client() -> None:
+    """Open the shared LLM HTTP client (called on app startup)."""
+    get_http_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared LLM HTTP client (called on app shutdown)."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
 
 
 # === SYSTEM PROMPT ===
 
+# PERSONALITY is static, so the rules block is joined once at import
+_PERSONALITY_RULES_BLOCK = "\n".join([f"- {rule}" for rule in PERSONALITY["rules"]])
+
+
 def _build_system_prompt() -> str:
     """Build the system prompt."""
     
     fields_desc = build_fields_description()
-    personality_rules = "\n".join([f"- {rule}" for rule in PERSONALITY["rules"]])
+    personality_rules = _PERSONALITY_RULES_BLOCK
     
     return f"""You are an onboarding assistant for a job platform helping job seekers find startup roles.
 
@@ -122,19 +253,41 @@ When all 6 fields are collected, respond with:
 """
 
 
-_SYSTEM_PROMPT: Optional[str] = None
+# Nothing in the prompt depends on runtime state, so build it at import
+SYSTEM_PROMPT: str = _build_system_prompt()
+
 
 def get_system_prompt() -> str:
-    """Get cached system prompt."""
-    global _SYSTEM_PROMPT
-    if _SYSTEM_PROMPT is None:
-        _SYSTEM_PROMPT = _build_system_prompt()
-    return _SYSTEM_PROMPT
+    """Get the system prompt (kept for callers outside this module)."""
+    return SYSTEM_PROMPT
+
+
+# The prompt is several KB; encode + escape it once instead of on every call.
+# Must be rebuilt if SYSTEM_PROMPT ever changes.
+_SYSTEM_MSG_JSON: bytes = orjson.dumps({"role": "system", "content": SYSTEM_PROMPT})
+_GEMINI_SYSTEM_JSON: bytes = orjson.dumps({"parts": [{"text": SYSTEM_PROMPT}]})
+
+
+def splice_json(body: dict, key: str, raw: bytes) -> bytes:
+    """Serialize `body` with an already-serialized `raw` value added under `key`."""
+    head = orjson.dumps(body)
+    return b"%s,%s:%s}" % (head[:-1], orjson.dumps(key), raw)
+
+
+def chat_messages_json(messages: list[dict]) -> bytes:
+    """JSON array of the prebuilt system message followed by `messages`."""
+    if not messages:
+        return b"[" + _SYSTEM_MSG_JSON + b"]"
+    return b"[" + _SYSTEM_MSG_JSON + b"," + orjson.dumps(messages)[1:]
 
 
 # === VALIDATION ===
 
-def _validate_llm_response(content: str) -> dict:
+# ```lang ... ``` around the JSON: drops the whole opening line and an
+# optional closing fence (some models forget it)
+_FENCE_RE = re.compile(r"\A```[^\n]*\n?(.*?)(?:\n?```)?\Z", re.DOTALL)
+
+def validate_llm_response(content: str) -> dict:
     """Validate and parse LLM response."""
     
     if not content or not content.strip():
@@ -144,126 +297,232 @@ def _validate_llm_response(content: str) -> dict:
     
     # Handle markdown code blocks
     if content.startswith("```"):
-        lines = content.splitlines()
-        if lines[0].startswith("```"):
-            lines = lines[1:]
-        if lines and lines[-1].strip() == "```":
-            lines = lines[:-1]
-        content = "\n".join(lines)
-    
-    # Parse JSONc
-    parsed = json.loads(content)
-    
-    # Validate required fields
-    if "response" not in parsed:
-        raise ValueError("LLM response missing 'response' field")
-    
-    if not parsed.get("response", "").strip():
-        raise ValueError("LLM returned empty 'response' field")
-    
-    # Set defaults
-    if "extracted" not in parsed:
-        parsed["extracted"] = {}
+        content = _FENCE_RE.match(content).group(1)
     
-    if "is_complete" not in parsed:
-        parsed["is_complete"] = False
-    
-    return parsed
+    # Parse + validate in one pass; LLMOutput's validator is built once at import.
+    # ValidationError is a ValueError, so call_llm retries on it as before.
+    return LLMOutput.model_validate_json(content).model_dump()
 
 
 # === LLM API CALLS ===
 
-async def _call_openai(messages: list[dict], temperature: float = 0.7) -> dict:
-    """Call OpenAI API (GPT-4o)."""
-    
-    system_prompt = get_system_prompt()
-    
-    api_messages = [{"role": "system", "content": system_prompt}]
-    api_messages.extend(messages)
-    
+class _ReplyScanner:
+    """
+    Incremental scanner over a streamed JSON reply.
+    Spots the end of the top-level object, and decodes the top-level
+    "response" string as it arrives so it can be shown before the reply
+    is complete.
+    """
+
+    __slots__ = (
+        "depth", "in_string", "escaped", "expect_key", "in_key", "key_chars",
+        "key", "capturing", "raw", "decoded_upto", "emitted", "complete",
+    )
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.expect_key = False
+        self.in_key = False
+        self.key_chars = []
+        self.key = ""
+        self.capturing = False
+        self.raw = []           # JSON-escaped source of the "response" value
+        self.decoded_upto = 0   # len(raw) at the last decode
+        self.emitted = 0        # decoded chars already returned
+        self.complete = False
+
+    def feed(self, text: str) -> str:
+        """Consume `text`; returns newly decoded "response" text (may be "")."""
+        for ch in text:
+            if self.complete:
+                break
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.in_key:
+                        self.in_key = False
+                        self.key = "".join(self.key_chars)
+                    self.capturing = False
+                    continue
+                if self.in_key:
+                    self.key_chars.append(ch)
+                elif self.capturing:
+                    self.raw.append(ch)
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    if self.expect_key:
+                        self.expect_key = False
+                        self.in_key = True
+                        self.key_chars = []
+                    elif self.key == "response":
+                        self.capturing = True
+            elif ch == "{":
+                self.depth += 1
+                if self.depth == 1:
+                    self.expect_key = True
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    self.complete = True
+            elif ch == "," and self.depth == 1:
+                self.expect_key = True
+        return self._decode_new()
+
+    def _decode_new(self) -> str:
+        if len(self.raw) == self.decoded_upto:
+            return ""
+        self.decoded_upto = len(self.raw)
+        raw = "".join(self.raw)
+        # A trailing escape may be cut mid-way (a lone backslash, half a
+        # \uXXXX or surrogate pair); back off until it parses
+        for cut in range(len(raw), max(len(raw) - 12, -1), -1):
+            try:
+                decoded = orjson.loads(f'"{raw[:cut]}"')
+                break
+            except orjson.JSONDecodeError:
+                continue
+        else:
+            return ""
+        if len(decoded) <= self.emitted:
+            return ""
+        new = decoded[self.emitted:]
+        self.emitted = len(decoded)
+        return new
+
+
+def _chat_body(model: str, messages: list[dict], temperature: float, stream: bool = False) -> bytes:
+    """Serialized OpenAI-style chat completion request."""
     request_body = {
-        "model": OPENAI_MODEL,
-        "messages": api_messages,
+        "model": model,
         "temperature": temperature,
         "max_tokens": 500,
         "response_format": {"type": "json_object"}
     }
-    
-    headers = {
-        "Authorization": f"Bearer {OPENAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    if stream:
+        request_body["stream"] = True
+    return splice_json(request_body, "messages", chat_messages_json(messages))
 
-    logger.debug(f"=== OPENAI REQUEST ===")
-    logger.debug(f"Model: {OPENAI_MODEL}")
-    logger.debug(f"Messages count: {len(api_messages)}")
-    logger.debug(f"Temperature: {temperature}")
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
+async def _stream_chat_deltas(url: str, headers: dict, body: bytes):
+    """
+    POST an OpenAI-style chat request with stream=true and yield the
+    message content deltas from the SSE events. Close the generator to
+    stop reading early (the HTTP stream is closed with it).
+    """
+    async with get_http_client().stream("POST", url, headers=headers, content=body) as response:
+        logger.debug("Stream status: %s", response.status_code)
+        if response.is_error:
+            # Load the body so error handling can log it
+            await response.aread()
+        response.raise_for_status()
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            choices = orjson.loads(data).get("choices")
+            if not choices:
+                continue
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+async def _stream_chat_content(url: str, headers: dict, body: bytes) -> str:
+    """
+    Collect a streamed chat reply. Stops reading as soon as the reply's
+    JSON object is complete.
+    """
+    parts = []
+    scanner = _ReplyScanner()
+    async with aclosing(_stream_chat_deltas(url, headers, body)) as deltas:
+        async for delta in deltas:
+            parts.append(delta)
+            scanner.feed(delta)
+            if scanner.complete:
+                break
+    return "".join(parts)
+
+
+async def _call_openai(messages: list[dict], temperature: float = 0.7) -> dict:
+    """Call OpenAI API (GPT-4o)."""
+    
+    logger.debug("=== OPENAI REQUEST ===")
+    logger.debug("Model: %s", OPENAI_MODEL)
+    logger.debug("Messages count: %d", len(messages) + 1)
+    logger.debug("Temperature: %s", temperature)
+
+    if LLM_STREAM:
+        content = await _stream_chat_content(
             OPENAI_API_URL,
-            headers=headers,
-            json=request_body
+            OPENAI_HEADERS,
+            _chat_body(OPENAI_MODEL, messages, temperature, stream=True)
         )
+        logger.debug("OpenAI content: %s", content[:200])
+        return validate_llm_response(content)
+
+    response = await get_http_client().post(
+        OPENAI_API_URL,
+        headers=OPENAI_HEADERS,
+        content=_chat_body(OPENAI_MODEL, messages, temperature)
+    )
         
-        logger.debug(f"OpenAI Status: {response.status_code}")
+    logger.debug("OpenAI Status: %s", response.status_code)
         
-        response.raise_for_status()
+    response.raise_for_status()
         
-        api_response = response.json()
+    api_response = orjson.loads(response.content)
 
-        if not api_response.get("choices"):
-            raise ValueError("OpenAI returned no choices")
+    if not api_response.get("choices"):
+        raise ValueError("OpenAI returned no choices")
         
-        content = api_response["choices"][0]["message"]["content"]
-        logger.debug(f"OpenAI content: {content[:200]}")
+    content = api_response["choices"][0]["message"]["content"]
+    logger.debug("OpenAI content: %s", content[:200])
         
-        return _validate_llm_response(content)
+    return validate_llm_response(content)
 
 
 async def _call_deepseek(messages: list[dict], temperature: float = 0.7) -> dict:
     """Call DeepSeek API."""
     
-    system_prompt = get_system_prompt()
-    
-    api_messages = [{"role": "system", "content": system_prompt}]
-    api_messages.extend(messages)
-    
-    request_body = {
-        "model": DEEPSEEK_MODEL,
-        "messages": api_messages,
-        "temperature": temperature,
-        "max_tokens": 500,
-        "response_format": {"type": "json_object"}
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    logger.debug(f"=== DEEPSEEK REQUEST ===")
-    logger.debug(f"Messages count: {len(api_messages)}")
+    logger.debug("=== DEEPSEEK REQUEST ===")
+    logger.debug("Messages count: %d", len(messages) + 1)
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
+    if LLM_STREAM:
+        content = await _stream_chat_content(
             DEEPSEEK_API_URL,
-            headers=headers,
-            json=request_body
+            _DEEPSEEK_HEADERS,
+            _chat_body(DEEPSEEK_MODEL, messages, temperature, stream=True)
         )
+        return validate_llm_response(content)
+
+    response = await get_http_client().post(
+        DEEPSEEK_API_URL,
+        headers=_DEEPSEEK_HEADERS,
+        content=_chat_body(DEEPSEEK_MODEL, messages, temperature)
+    )
         
-        logger.debug(f"DeepSeek Status: {response.status_code}")
+    logger.debug("DeepSeek Status: %s", response.status_code)
         
-        response.raise_for_status()
+    response.raise_for_status()
         
-        api_response = response.json()
+    api_response = orjson.loads(response.content)
 
-        if not api_response.get("choices"):
-            raise ValueError("DeepSeek returned no choices")
+    if not api_response.get("choices"):
+        raise ValueError("DeepSeek returned no choices")
         
-        content = api_response["choices"][0]["message"]["content"]
+    content = api_response["choices"][0]["message"]["content"]
         
-        return _validate_llm_response(content)
+    return validate_llm_response(content)
 
 
 
@@ -274,8 +533,6 @@ async def _call_gemini(conversation_history: list[dict], temperature: float = 0.
     Gemini uses a different format than OpenAI.
     """
 
-    system_prompt = get_system_prompt()
-
     # Convert our format to Gemini format
     # Gemini wants: {"role": "user", "parts": [{"text": "..."}]}
     gemini_contents = []
@@ -285,9 +542,12 @@ async def _call_gemini(conversation_history: list[dict], temperature: float = 0.
 
     for msg in conversation_history:
         role = msg["role"]
-        # Gemini uses "user" and "model" (not "assistant")
+        # Gemini uses "user" and "model" (not "assistant"), and only
+        # systemInstruction can be system - in-history notes go as "user"
         if role == "assistant":
             role = "model"
+        elif role == "system":
+            role = "user"
 
         gemini_contents.append({
             "role": role,
@@ -296,9 +556,6 @@ async def _call_gemini(conversation_history: list[dict], temperature: float = 0.
 
     request_body = {
         "contents": gemini_contents,
-        "systemInstruction": {
-            "parts": [{"text": system_prompt}]
-        },
         "generationConfig": {
             "temperature": temperature,
             "maxOutputTokens": 500,
@@ -306,96 +563,347 @@ async def _call_gemini(conversation_history: list[dict], temperature: float = 0.
         }
     }
 
-    url = f"{GEMINI_API_URL}?key={GEMINI_API_KEY}"
+    logger.debug("=== GEMINI REQUEST ===")
+    logger.debug("URL: %s", GEMINI_API_URL)
+    logger.debug("Messages count: %d", len(gemini_contents))
 
-    headers = {
-        "Content-Type": "application/json"
-    }
+    response = await get_http_client().post(
+        _GEMINI_REQUEST_URL,
+        headers=_GEMINI_HEADERS,
+        content=splice_json(request_body, "systemInstruction", _GEMINI_SYSTEM_JSON)
+    )
 
-    logger.debug(f"=== GEMINI REQUEST ===")
-    logger.debug(f"URL: {GEMINI_API_URL}")
-    logger.debug(f"Messages count: {len(gemini_contents)}")
+    logger.debug("Gemini Status: %s", response.status_code)
+    logger.debug("Gemini Response: %s", response.text[:500])
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            url,
-            headers=headers,
-            json=request_body
-        )
+    response.raise_for_status()
 
-        logger.debug(f"Gemini Status: {response.status_code}")
-        logger.debug(f"Gemini Response: {response.text[:500]}")
+    api_response = orjson.loads(response.content)
+
+    # Gemini response structure:
+    # {"candidates": [{"content": {"parts": [{"text": "..."}]}}]}
+
+    if not api_response.get("candidates"):
+        raise ValueError("Gemini returned no candidates")
+
+    content = api_response["candidates"][0]["content"]["parts"][0]["text"]
+    logger.debug("Gemini content: %s", content)
+
+    return validate_llm_response(content)
+
+# === PROVIDER DISPATCH ===
+
+# Provider name -> (call, API key); unknown LLM_PROVIDER values use DeepSeek
+_PROVIDERS = {
+    "openai": (_call_openai, OPENAI_API_KEY),
+    "gemini": (_call_gemini, GEMINI_API_KEY),
+    "deepseek": (_call_deepseek, DEEPSEEK_API_KEY),
+}
+_PRIMARY_PROVIDER = LLM_PROVIDER if LLM_PROVIDER in _PROVIDERS else "deepseek"
+
+_PROVIDER_MODELS = {
+    "openai": OPENAI_MODEL,
+    "gemini": GEMINI_MODEL,
+    "deepseek": DEEPSEEK_MODEL,
+}
 
-        response.raise_for_status()
 
-        api_response = response.json()
+def resolve_provider(provider: str | None = None) -> str:
+    """The provider to call: `provider` when given (must be a known one), else the configured one."""
+    if provider is None:
+        return _PRIMARY_PROVIDER
+    if provider not in _PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {provider!r}")
+    return provider
 
-        # Gemini response structure:
-        # {"candidates": [{"content": {"parts": [{"text": "..."}]}}]}
 
-        if not api_response.get("candidates"):
-            raise ValueError("Gemini returned no candidates")
+# Per-provider bulkheads
+_LLM_SEMAPHORES = {
+    name: asyncio.Semaphore(limit) for name, limit in LLM_MAX_CONCURRENCY.items()
+}
+
+# Per-provider rate limiters (only for budgets that are set)
+_RPM_LIMITERS = {name: TokenBucket(rpm) for name, rpm in LLM_RPM.items() if rpm > 0}
+_TPM_LIMITERS = {name: TokenBucket(tpm) for name, tpm in LLM_TPM.items() if tpm > 0}
+
+# Reply budget per call (max_tokens / maxOutputTokens in the request bodies)
+_MAX_OUTPUT_TOKENS = 500
+
+
+def _estimate_tokens(conversation_history: list[dict]) -> int:
+    """Rough token count for a call (~4 chars per token) including the reply."""
+    chars = len(SYSTEM_PROMPT) + sum(len(m["content"]) for m in conversation_history)
+    return chars // 4 + _MAX_OUTPUT_TOKENS
+
+
+# First other provider with a key configured, used as the hedge
+_HEDGE_PROVIDER = next(
+    (name for name, (_, key) in _PROVIDERS.items() if name != _PRIMARY_PROVIDER and key),
+    None
+)
+
 
-        content = api_response["candidates"][0]["content"]["parts"][0]["text"]
-        logger.debug(f"Gemini content: {content}")
+async def _acquire_rate_budget(name: str, conversation_history: list[dict]) -> None:
+    """Wait for the provider's request/token budget, where one is set."""
+    if name in _RPM_LIMITERS:
+        await _RPM_LIMITERS[name].acquire()
+    if name in _TPM_LIMITERS:
+        await _TPM_LIMITERS[name].acquire(_estimate_tokens(conversation_history))
+
+
+async def _run_provider(name: str, conversation_history: list[dict], temperature: float) -> dict:
+    """Call one provider inside its rate budget and concurrency bulkhead."""
+    await _acquire_rate_budget(name, conversation_history)
+    async with _LLM_SEMAPHORES[name]:
+        return await _PROVIDERS[name][0](conversation_history, temperature)
+
+
+# Providers with an OpenAI-style streaming chat endpoint: (url, headers, model)
+_CHAT_STREAM_TARGETS = {
+    "openai": (OPENAI_API_URL, OPENAI_HEADERS, OPENAI_MODEL),
+    "deepseek": (DEEPSEEK_API_URL, _DEEPSEEK_HEADERS, DEEPSEEK_MODEL),
+}
+
+
+async def _stream_provider(name: str, conversation_history: list[dict], temperature: float):
+    """Yield one provider's reply deltas inside its rate budget and concurrency bulkhead."""
+    await _acquire_rate_budget(name, conversation_history)
+    url, headers, model = _CHAT_STREAM_TARGETS[name]
+    body = _chat_body(model, conversation_history, temperature, stream=True)
+    async with _LLM_SEMAPHORES[name]:
+        async with aclosing(_stream_chat_deltas(url, headers, body)) as deltas:
+            async for delta in deltas:
+                yield delta
+
+
+async def _call_hedged(conversation_history: list[dict], temperature: float) -> dict:
+    """
+    Start the primary provider; if it hasn't succeeded after
+    HEDGE_DELAY_SECONDS (or failed sooner), start the hedge provider too.
+    Returns the first successful reply and cancels the other call; raises
+    the last error only if both fail.
+    """
+    primary = asyncio.create_task(
+        _run_provider(_PRIMARY_PROVIDER, conversation_history, temperature)
+    )
+    tasks = [primary]
+    try:
+        await asyncio.wait(tasks, timeout=HEDGE_DELAY_SECONDS)
+        if primary.done() and primary.exception() is None:
+            return primary.result()
+
+        logger.info("Hedging to %s", _HEDGE_PROVIDER)
+        tasks.append(asyncio.create_task(
+            _run_provider(_HEDGE_PROVIDER, conversation_history, temperature)
+        ))
+        pending = set(tasks)
+        last_error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _call_provider(
+    conversation_history: list[dict],
+    temperature: float,
+    hedge: bool = True,
+    provider: str | None = None
+) -> dict:
+    """
+    Call `provider` (default: the configured one). Only the configured
+    provider is hedged - when allowed, HEDGE_LLM is on and a backup has a key.
+    """
+    name = provider or _PRIMARY_PROVIDER
+    if hedge and HEDGE_LLM and _HEDGE_PROVIDER and name == _PRIMARY_PROVIDER:
+        return await _call_hedged(conversation_history, temperature)
+    return await _run_provider(name, conversation_history, temperature)
 
-        return _validate_llm_response(content)
 
 # === UNIFIED LLM CALL WITH RETRY ===
 
-async def call_llm(conversation_history: list[dict]) -> dict:
-    """Call LLM with retry logic."""
-    
-    logger.info(f"Calling LLM provider: {LLM_PROVIDER}")
+# First-attempt temperature; retries go up by 0.1 each
+BASE_TEMPERATURE = 0.7
+
+# Exact-match reply cache; installed by init_llm_cache() on startup
+# (stays None when LLM_CACHE_TTL=0 or for hosts that never call it)
+_LLM_CACHE: LLMCache | None = None
+
+
+async def init_llm_cache() -> LLMCache | None:
+    """Build the LLM reply cache from settings and use it for call_llm (called on app startup)."""
+    global _LLM_CACHE
+    _LLM_CACHE = build_llm_cache()
+    return _LLM_CACHE
+
+
+async def close_llm_cache() -> None:
+    """Close the LLM reply cache's backend (called on app shutdown)."""
+    global _LLM_CACHE
+    if _LLM_CACHE is not None:
+        await _LLM_CACHE.close()
+        _LLM_CACHE = None
+
+
+async def call_llm(conversation_history: list[dict], provider: str | None = None) -> dict:
+    """Call LLM with retry logic (on `provider`, default the configured one)."""
+    provider = resolve_provider(provider)
+    logger.debug("Calling LLM provider: %s", provider)
+
+    # An identical conversation already got an accepted reply - reuse it
+    key = _reply_cache_key(conversation_history, provider)
+    if key is not None:
+        cached = await _LLM_CACHE.get(key)
+        if cached is not None:
+            logger.info("LLM cache hit")
+            return cached
     
     last_error = None
     
     for attempt in range(MAX_RETRIES):
+        retry_after = None
         try:
             # Vary temperature on retry
-            temperature = 0.7 + (attempt * 0.1)
+            temperature = BASE_TEMPERATURE + (attempt * 0.1)
             
-            logger.info(f"Attempt {attempt + 1}/{MAX_RETRIES} (temp={temperature})")
+            logger.debug("Attempt %d/%d (temp=%s)", attempt + 1, MAX_RETRIES, temperature)
             
-            # Call appropriate provider
-            if LLM_PROVIDER == "openai":
-                result = await _call_openai(conversation_history, temperature)
-            elif LLM_PROVIDER == "gemini":
-                result = await _call_gemini(conversation_history, temperature)
-            else:
-                result = await _call_deepseek(conversation_history, temperature)
+            # Call appropriate provider; only the first attempt is hedged,
+            # retries stay sequential
+            result = await _call_provider(
+                conversation_history, temperature, hedge=attempt == 0, provider=provider
+            )
             
-            logger.info(f"Success on attempt {attempt + 1}")
-            logger.info(f"Extracted: {result.get('extracted', {})}")
+            logger.debug("Success on attempt %d", attempt + 1)
+            logger.debug("Extracted: %s", result.get("extracted", {}))
+
+            # Completion replies end the session - not worth caching
+            if key is not None and not result.get("is_complete"):
+                await _LLM_CACHE.set(key, result)
             
             return result
             
         except httpx.HTTPStatusError as e:
             last_error = e
-            logger.warning(f"HTTP error: {e.response.status_code} - {e.response.text[:200]}")
+            logger.warning("HTTP error: %s - %s", e.response.status_code, e.response.text[:200])
             
-            if e.response.status_code in [401, 403]:
-                logger.error("Authentication error - not retrying")
+            if e.response.status_code in NON_RETRYABLE_STATUS:
+                logger.error("Non-retryable status %s - not retrying", e.response.status_code)
                 break
+
+            if e.response.status_code in RETRY_AFTER_STATUS:
+                retry_after = _retry_after_seconds(e.response)
                 
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError) as e:
             last_error = e
-            logger.warning(f"Parse error: {e}")
+            logger.warning("Parse error: %s", e)
             
         except Exception as e:
             last_error = e
-            logger.warning(f"Unexpected error: {type(e).__name__}: {e}")
+            logger.warning("Unexpected error: %s: %s", type(e).__name__, e)
         
         if attempt < MAX_RETRIES - 1:
-            delay = RETRY_DELAY_SECONDS * (2 ** attempt)
-            logger.info(f"Waiting {delay}s before retry...")
+            # Half fixed, half random, so clients that failed together
+            # don't all retry in the same instant
+            delay = min(RETRY_DELAY_SECONDS * (2 ** attempt), MAX_RETRY_DELAY_SECONDS)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+            if retry_after is not None:
+                # The provider told us when to come back
+                delay = retry_after
+            logger.info("Waiting %.2fs before retry...", delay)
             await asyncio.sleep(delay)
     
-    logger.error(f"All {MAX_RETRIES} attempts failed. Last error: {last_error}")
-    return _fallback_response("We're having trouble connecting. Could you try that again?")
+    logger.error("All %d attempts failed. Last error: %s", MAX_RETRIES, last_error)
+    return fallback_response("We're having trouble connecting. Could you try that again?")
+
+
+def _reply_cache_key(conversation_history: list[dict], provider: str | None = None) -> str | None:
+    """Reply-cache key for a first-attempt call, or None when caching is off."""
+    if _LLM_CACHE is None:
+        return None
+    provider = provider or _PRIMARY_PROVIDER
+    return cache_key(
+        provider,
+        _PROVIDER_MODELS[provider],
+        conversation_history,
+        BASE_TEMPERATURE
+    )
+
+
+async def stream_llm(conversation_history: list[dict]):
+    """
+    Streaming variant of call_llm. Yields ("delta", text) events with the
+    reply's "response" text as it is generated, then one ("result", dict)
+    with the validated reply.
+
+    Only OpenAI/DeepSeek stream; other providers, cache hits, and a failed
+    stream go through call_llm (with its retries) and arrive as a single
+    delta. If a stream fails part-way, the "result" reply is the one to show.
+    """
+    key = _reply_cache_key(conversation_history)
+    if key is not None:
+        cached = await _LLM_CACHE.get(key)
+        if cached is not None:
+            logger.info("LLM cache hit")
+            yield "delta", cached["response"]
+            yield "result", cached
+            return
+
+    emitted = False
+    if _PRIMARY_PROVIDER in _CHAT_STREAM_TARGETS:
+        parts = []
+        scanner = _ReplyScanner()
+        result = None
+        try:
+            stream = _stream_provider(_PRIMARY_PROVIDER, conversation_history, BASE_TEMPERATURE)
+            async with aclosing(stream) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    text = scanner.feed(delta)
+                    if text:
+                        emitted = True
+                        yield "delta", text
+                    if scanner.complete:
+                        break
+            result = validate_llm_response("".join(parts))
+        except Exception as e:
+            logger.warning("Streaming call failed, falling back: %s: %s", type(e).__name__, e)
+
+        if result is not None:
+            if key is not None and not result.get("is_complete"):
+                await _LLM_CACHE.set(key, result)
+            yield "result", result
+            return
+
+    result = await call_llm(conversation_history)
+    if not emitted:
+        yield "delta", result["response"]
+    yield "result", result
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    """Seconds from a Retry-After header (delta or HTTP date), capped; None if absent/invalid."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
 
 
-def _fallback_response(message: str) -> dict:
+def fallback_response(message: str) -> dict:
     """Return safe fallback response."""
     return {
         "extracted": {},
@@ -407,34 +915,65 @@ def _fallback_response(message: str) -> dict:
 
 # === MAIN PROCESSING ===
 
-async def process_message(session: SessionData, user_message: str) -> dict:
-    """Process a user message and return the next response."""
+# Names the LLM may fill in on the profile
+_PROFILE_FIELDS = frozenset(UserProfile.model_fields)
+
+# What the system prompt tells the LLM to answer once every field is set
+_COMPLETION_RESULT = {
+    "response": COMPLETION["message"],
+    "extracted": {},
+    "is_complete": True,
+    "error": False
+}
+
+
+def build_llm_history(session: SessionData, user_message: str) -> list[dict]:
+    """Messages to send to the LLM for `user_message` (system prompt excluded)."""
+
+    history = session.conversation_history
+    conversation_history = []
+    if LLM_HISTORY_WINDOW and len(history) > LLM_HISTORY_WINDOW:
+        # Keep the prompt size bounded; the dropped turns only matter for
+        # what they extracted, which the profile already holds
+        history = history[-LLM_HISTORY_WINDOW:]
+        collected = get_collected_field(session.profile)
+        conversation_history.append({
+            "role": "system",
+            "content": f"Already extracted: {orjson.dumps(collected).decode()}"
+        })
 
-    conversation_history = [
+    conversation_history.extend(
         {"role": msg["role"], "content": msg["content"]}
-        for msg in session.conversation_history
-    ]
+        for msg in history
+    )
 
     conversation_history.append({
         "role": "user",
         "content": user_message
     })
 
-    print(f"\n🔍 CONVERSATION HISTORY SENT TO LLM:")
-    for i, msg in enumerate(conversation_history):
-        print(f"  {i+1}. [{msg['role']}]: {msg['content'][:100]}")
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, msg in enumerate(conversation_history):
+            logger.debug("CONV HIST[%d]: %s=%s", i + 1, msg["role"], msg["content"][:100])
 
-    llm_response = await call_llm(conversation_history)
+    return conversation_history
 
-    print(f"\n✨ RAW LLM RESPONSE:")
-    print(f"  Full response: {llm_response}")
 
-    extracted = llm_response.get("extracted", {})
+def apply_llm_result(session: SessionData, llm_response: dict) -> dict:
+    """Copy extracted fields onto the session profile and build the turn result."""
+
+    logger.debug("RAW LLM RESPONSE: %s", llm_response)
+
+    # Parsed keys are fresh strings; interning them makes the profile
+    # attribute lookups below (and downstream dict merges) identity compares
+    extracted = {
+        sys.intern(k): v for k, v in llm_response.get("extracted", {}).items()
+    }
 
     for field_name, value in extracted.items():
-        if hasattr(session.profile, field_name):
+        if field_name in _PROFILE_FIELDS:
             setattr(session.profile, field_name, value)
-            print(f"  ✅ Set {field_name} = {value}")
+            logger.debug("Set %s = %s", field_name, value)
 
     return {
         "response": llm_response.get("response", ""),
@@ -444,6 +983,43 @@ async def process_message(session: SessionData, user_message: str) -> dict:
     }
 
 
+async def process_message(
+    session: SessionData,
+    user_message: str,
+    provider: str | None = None
+) -> dict:
+    """Process a user message and return the next response (`provider` overrides LLM_PROVIDER)."""
+
+    # Profile already complete: the LLM's answer is fixed, skip the call
+    if not get_missing_fields(session.profile):
+        logger.info("All fields collected - returning completion without LLM call")
+        return {**_COMPLETION_RESULT, "extracted": {}}
+
+    llm_response = await call_llm(build_llm_history(session, user_message), provider)
+    return apply_llm_result(session, llm_response)
+
+
+async def stream_message(session: SessionData, user_message: str):
+    """
+    Streaming variant of process_message: yields ("delta", text) events as
+    the reply is generated, then ("result", dict) shaped like
+    process_message's return value.
+    """
+    if not get_missing_fields(session.profile):
+        logger.info("All fields collected - returning completion without LLM call")
+        yield "delta", _COMPLETION_RESULT["response"]
+        yield "result", {**_COMPLETION_RESULT, "extracted": {}}
+        return
+
+    llm_response = None
+    async for kind, payload in stream_llm(build_llm_history(session, user_message)):
+        if kind == "delta":
+            yield kind, payload
+        else:
+            llm_response = payload
+    yield "result", apply_llm_result(session, llm_response)
+
+
 
 
 
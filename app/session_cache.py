@@ -0,0 +1,65 @@
+"""
+In-process cache of in-progress SessionData, keyed by session_id.
+Saves the per-turn session + profile reload while a user is mid-onboarding.
+
+Entries expire after a TTL and the least recently used are evicted past
+maxsize. The cache is per worker process, so with several workers (or
+instances) another worker may have moved a session on since it was cached:
+callers check a hit against the database (the history length, see
+main._load_session) and reload on a mismatch. The per-session lock is also
+per process - it does not serialize turns across workers.
+"""
+
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+from app.models import SessionData
+
+
+class SessionCache:
+    """Bounded TTL + LRU cache with a per-session asyncio.Lock."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, SessionData]]" = OrderedDict()
+        # Locks live only as long as someone holds them
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Lock serializing turns of one session (load -> LLM -> write)."""
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if expires_at < time.monotonic():
+            del self._entries[session_id]
+            return None
+        self._entries.move_to_end(session_id)
+        return session
+
+    def put(self, session_id: str, session: SessionData) -> None:
+        if self._maxsize <= 0:
+            return
+        self._entries[session_id] = (time.monotonic() + self._ttl, session)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+
+
+# Global instance
+session_cache = SessionCache(settings.SESSION_CACHE_MAXSIZE, settings.SESSION_CACHE_TTL)
@@ -4,11 +4,19 @@ FastAPI application for AI-powered onboarding.
 import sys
 import asyncio
 import logging
-import traceback
+from typing import Optional
+from uuid import UUID
 
-# FORCE WINDOWS TO USE THE CORRECT EVENT LOOP
+# FORCE WINDOWS TO USE THE CORRECT EVENT LOOP; elsewhere prefer uvloop
+# (set before anything else is imported so no loop exists yet)
 if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+else:
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass  # uvloop is optional; the default asyncio loop is used
 
 from dotenv import load_dotenv
 import os 
@@ -22,54 +30,99 @@ configure_logging()
 logger = get_logger("main")
 
 logger.info("=== ENV DEBUG ===")
-logger.info(f".env loaded: {loaded}")
-logger.info(f"DEEPSEEK_API_URL: {os.getenv('DEEPSEEK_API_URL')}")
-logger.info(f"DEEPSEEK_API_KEY: {'SET' if os.getenv('DEEPSEEK_API_KEY') else 'NOT SET'}")
+logger.info(".env loaded: %s", loaded)
+logger.info("DEEPSEEK_API_URL: %s", os.getenv("DEEPSEEK_API_URL"))
+logger.info("DEEPSEEK_API_KEY: %s", "SET" if os.getenv("DEEPSEEK_API_KEY") else "NOT SET")
 logger.info("=================")
 
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.exceptions import RequestValidationError
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
+import orjson
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db import get_db, engine
+from app.db import get_db, db_scope, engine, warm_pool
+from app.core.config import settings
 
 from app.models import (
     InitRequest,
     AnswerRequest,
     OnboardingResponse,
+    SessionData,
     SessionStatus,
     UserProfile as PydanticUserProfile,
 )
-from app.services import process_message
+from app.services import (
+    process_message,
+    stream_message,
+    init_http_client,
+    close_http_client,
+    init_llm_cache,
+    close_llm_cache,
+)
 from app.questions import get_first_question, COMPLETION
 import app.db_operations as db_ops
-from app.models_db.db_models import SessionStatusEnum
+from app.session_cache import session_cache
+
+# Static copy, resolved once instead of per request
+_FIRST_QUESTION = get_first_question()
+_COMPLETION_ANIMATION = COMPLETION["animation"]
+
+# Constant health-check bodies, encoded once
+_ROOT_BYTES = orjson.dumps({"status": "ok", "service": "Onboarding API", "version": "1.0.0"})
+_TEST_DB_OK_BYTES = orjson.dumps({"status": "success", "result": 1})
 
 # === LIFESPAN & APP SETUP ===
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Startup and shutdown events."""
-    logger.info(">> Onboarding API starting...")
-    
-    # Check Database Connection on Startup
+async def _probe_db():
+    """Check Database Connection on Startup (logs only)."""
     try:
         async with engine.connect() as conn:
             result = await conn.execute(text("SELECT version()"))
             logger.info("[OK] CONNECTION SUCCESSFUL!")
-            logger.info(f"     DB Version: {result.scalar()}")
+            logger.info("     DB Version: %s", result.scalar())
     except Exception as e:
-        logger.error(f"[ERROR] CONNECTION FAILED: {e}")
+        logger.error("[ERROR] CONNECTION FAILED: %s", e)
         # We don't raise here to allow the app to start even if DB is flaky, 
         # but requests will fail.
+
+
+async def _warm_db_pool():
+    """Fill the pool now rather than on the first requests."""
+    warm = settings.DB_POOL_SIZE if settings.DB_POOL_WARM is None else settings.DB_POOL_WARM
+    warm = min(warm, settings.DB_POOL_SIZE)
+    if warm > 0:
+        try:
+            opened = await warm_pool(warm)
+            logger.info("[OK] Pool warmed: %d/%d connections", opened, warm)
+        except Exception as e:
+            logger.warning("Pool warm-up failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown events."""
+    logger.info(">> Onboarding API starting...")
+    await init_http_client()
+    # One reply cache per process; call_llm/stream_llm use it through services
+    await init_llm_cache()
+
+    # Probe and warm-up run side by side in the background; the app is
+    # ready to serve without waiting on either
+    db_startup = asyncio.gather(_probe_db(), _warm_db_pool())
     
     yield
     
     logger.info(">> Onboarding API shutting down...")
+    # Don't leave a slow probe / warm-up running into engine.dispose()
+    db_startup.cancel()
+    with suppress(asyncio.CancelledError):
+        await db_startup
+    await close_http_client()
+    await close_llm_cache()
     await engine.dispose()
 
 app = FastAPI(
@@ -79,35 +132,23 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS - allow frontend to call API
+# CORS - allow the frontend origins in settings; browsers cache preflights
+# for CORS_MAX_AGE. Request logging is left to uvicorn's access log.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=settings.CORS_ORIGINS,
+    allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
+    allow_methods=settings.CORS_ALLOW_METHODS,
+    allow_headers=settings.CORS_ALLOW_HEADERS,
+    max_age=settings.CORS_MAX_AGE,
 )
 
-# === MIDDLEWARE ===
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log every incoming request and its result."""
-    logger.info(f"👉 MIDDLEWARE: Received {request.method} {request.url.path}")
-    try:
-        response = await call_next(request)
-        logger.info(f"✅ MIDDLEWARE: Response code {response.status_code}")
-        return response
-    except Exception as e:
-        logger.error(f"❌ MIDDLEWARE: Request failed with {e}")
-        raise
-
 # === EXCEPTION HANDLERS ===
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle 422 Validation Errors gracefully."""
-    logger.warning(f"⚠️ VALIDATION ERROR at {request.url}: {exc.errors()}")
+    logger.warning("⚠️ VALIDATION ERROR at %s: %s", request.url, exc.errors())
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors(), "message": "Invalid data sent"}
@@ -116,35 +157,125 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Catch-all for 500 errors."""
-    logger.error(f"🔥 GLOBAL CRASH on {request.method} {request.url.path}")
-    logger.error(f"Error Type: {type(exc).__name__}")
-    logger.error(f"Error Message: {str(exc)}")
-    logger.error(traceback.format_exc()) # Print full stack trace
+    # logger.exception attaches exc_info; the trace is formatted by the log listener thread
+    logger.exception("🔥 GLOBAL CRASH on %s %s", request.method, request.url.path)
 
     return JSONResponse(
         status_code=500,
         content={"detail": f"Internal server error: {str(exc)}"}
     )
 
+# === HELPERS ===
+
+def _profile_from_row(profile) -> PydanticUserProfile:
+    """
+    Pydantic profile from a DB row (or another profile) without a validation
+    pass - the values are our own. NULL columns map to "" as the model's
+    validator would.
+    """
+    return PydanticUserProfile.model_construct(
+        name=profile.name or "",
+        role=profile.role or "",
+        experience_level=profile.experience_level or "",
+        location=profile.location or "",
+        startup_stage=profile.startup_stage or "",
+        extra_preferences=profile.extra_preferences or ""
+    )
+
+
+async def _load_session(session_uuid: UUID, session_key: str) -> SessionData:
+    """
+    The session's working copy - cached, or loaded from the DB on a miss.
+    Call with the session lock held.
+    """
+    temp_session = session_cache.get(session_key)
+
+    async with db_scope() as db:
+        if temp_session is not None:
+            # Another worker may have taken a turn since this copy was cached;
+            # every turn appends to the history, so its length tells us
+            length = await db_ops.get_active_history_length(db, session_uuid)
+            if length == len(temp_session.conversation_history):
+                return temp_session
+            session_cache.invalidate(session_key)
+
+        # Get session from database
+        session = await db_ops.get_active_session_with_profile(db, session_uuid)
+
+        if session is None:
+            # Missing or completed: tell them apart with the narrow status
+            # read instead of loading the whole history
+            status = await db_ops.get_session_status(db, session_uuid)
+            if status is None:
+                logger.info(">> Session not found: %s", session_key)
+                raise HTTPException(status_code=404, detail="Session not found")
+
+            logger.warning(">> Session already completed")
+            raise HTTPException(status_code=400, detail="Session already completed")
+
+        # Convert DB session to format that process_message expects
+        # (trusted DB data - no validation pass)
+        temp_session = SessionData.model_construct(
+            session_id=str(session.session_id),
+            user_id=session.user_id,
+            created_at=session.created_at,
+            status=SessionStatus.IN_PROGRESS,
+            profile=_profile_from_row(session.profile),
+            conversation_history=list(session.conversation_history or ())
+        )
+    session_cache.put(session_key, temp_session)
+    return temp_session
+
+
+async def _insert_user_message(session_uuid: UUID, answer: str):
+    # Own AsyncSession - it runs concurrently with the LLM call
+    async with db_scope() as db:
+        return await db_ops.add_messages(db, session_uuid, [("user", answer)])
+
+
+async def _record_turn(session_uuid: UUID, session_key: str, temp_session: SessionData, result: dict, user_appended):
+    """
+    Write the assistant reply, extracted fields and completion in one
+    transaction and keep the cached copy in step. Returns the final profile
+    when this turn completed the session, else None.
+    """
+    async with db_scope() as db:
+        recorded = await db_ops.add_messages_and_update(
+            db,
+            session_uuid,
+            [("assistant", result["response"])],
+            result.get("extracted") or {},
+            is_complete=bool(result.get("is_complete"))
+        )
+
+    if result.get("is_complete") and recorded is not None:
+        session_cache.invalidate(session_key)
+        # Profile as written (RETURNING); the turn's copy is a fine stand-in
+        return recorded[1] or temp_session.profile
+
+    # Keep the cached history in step with what was written
+    if user_appended is None or recorded is None:
+        session_cache.invalidate(session_key)
+    else:
+        temp_session.conversation_history.extend(user_appended)
+        temp_session.conversation_history.extend(recorded[0])
+    return None
+
 # === ENDPOINTS ===
 
 @app.get("/test-db")
 async def test_endpoint(db: AsyncSession = Depends(get_db)):
     # Endpoint to test manually
     try:
-        result = await db.execute(text("SELECT 1"))
-        return {"status": "success", "result": result.scalar()}
+        await db.execute(text("SELECT 1"))
+        return Response(_TEST_DB_OK_BYTES, media_type="application/json")
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 @app.get("/")
 async def root():
     """Health check endpoint."""
-    return {
-        "status": "ok",
-        "service": "Onboarding API",
-        "version": "1.0.0"
-    }
+    return Response(_ROOT_BYTES, media_type="application/json")
 
 
 @app.post("/api/onboarding/start", response_model=OnboardingResponse)
@@ -154,142 +285,185 @@ async def start_onboarding(request: InitRequest, db: AsyncSession = Depends(get_
     Returns the first question (hardcoded).
     """
     try:
-        logger.info(f"{'='*60}")
-        logger.info(f">> START ONBOARDING REQUEST for User ID: {request.user_id}")
+        logger.debug(">> START ONBOARDING REQUEST for User ID: %s", request.user_id)
 
         # Create new session in database
-        logger.info(">> Creating session in database...")
         session = await db_ops.create_session(db, request.user_id)
-        logger.info(f">> Session created: {session.session_id}")
+        logger.info(">> Session created: %s (user %s)", session.session_id, request.user_id)
 
         # Get the first question
-        first_question = get_first_question()
-        logger.info(f">> First question: {first_question}")
+        first_question = _FIRST_QUESTION
 
         # Add first question to history
-        logger.info(">> Adding first question to history...")
         await db_ops.add_message(
             db=db,
             session_id=session.session_id,
             role="assistant",
             content=first_question
         )
-        logger.info(">> Message added successfully")
 
-        response = OnboardingResponse(
+        response = OnboardingResponse.model_construct(
             session_id=str(session.session_id),
             success=True,
             response=first_question,
             is_complete=False,
         )
-        logger.info(f">> Returning response for session {session.session_id}")
         return response
 
     except Exception as e:
-        logger.error(">> ERROR IN START ONBOARDING")
-        logger.error(traceback.format_exc())
+        logger.exception(">> ERROR IN START ONBOARDING")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.post("/api/onboarding/answer", response_model=OnboardingResponse)
-async def submit_answer(request: AnswerRequest, db: AsyncSession = Depends(get_db)):
+async def submit_answer(request: AnswerRequest):
     """
     Submit an answer and get the next question.
+
+    Uses db_scope() instead of Depends(get_db) so no DB connection is held
+    while waiting on the LLM.
     """
-    import uuid as uuid_module
-
-    logger.info(f"{'='*60}")
-    logger.info(f">> ANSWER REQUEST Session ID: {request.session_id}")
-    logger.info(f"User Answer: {request.answer}")
-
-    # Get session from database
-    session_uuid = uuid_module.UUID(request.session_id)
-    session = await db_ops.get_session(db, session_uuid)
-
-    if session is None:
-        logger.warning(f">> Session not found: {request.session_id}")
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    if session.status == SessionStatusEnum.COMPLETED:
-        logger.warning(">> Session already completed")
-        raise HTTPException(status_code=400, detail="Session already completed")
-
-    logger.info(f">> Processing message. Current history length: {len(session.conversation_history)}")
-
-    # Convert DB session to format that process_message expects
-    from app.models import SessionData
-    temp_session = SessionData(
-        session_id=str(session.session_id),
-        user_id=session.user_id,
-        status=SessionStatus.IN_PROGRESS,
-        profile=PydanticUserProfile(
-            name=session.profile.name,
-            role=session.profile.role,
-            experience_level=session.profile.experience_level,
-            location=session.profile.location,
-            startup_stage=session.profile.startup_stage,
-            extra_preferences=session.profile.extra_preferences
-        ),
-        conversation_history=session.conversation_history
+    logger.info(">> ANSWER REQUEST Session ID: %s", request.session_id)
+    logger.debug("User Answer: %s", request.answer)
+
+    # Already parsed to a UUID during request validation
+    session_uuid = request.session_id
+    session_key = str(session_uuid)
+
+    # One turn per session at a time; the cached copy is only touched under this lock
+    async with session_cache.lock(session_key):
+        temp_session = await _load_session(session_uuid, session_key)
+
+        logger.debug(">> Processing message. Current history length: %d", len(temp_session.conversation_history))
+
+        try:
+            # The user message doesn't depend on the LLM reply, so its INSERT
+            # overlaps the LLM call (no DB connection held while waiting on it)
+            result, user_appended = await asyncio.gather(
+                process_message(temp_session, request.answer),
+                _insert_user_message(session_uuid, request.answer)
+            )
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(">> LLM RESULT:")
+                logger.debug("Response: %s", result["response"])
+                logger.debug("Extracted: %s", result["extracted"])
+                logger.debug("Is complete: %s", result.get("is_complete", False))
+
+            profile = await _record_turn(session_uuid, session_key, temp_session, result, user_appended)
+        except BaseException:
+            # process_message already mutated the cached copy; don't trust it
+            session_cache.invalidate(session_key)
+            raise
+
+    if profile is not None:
+        return OnboardingResponse.model_construct(
+            session_id=session_key,
+            success=True,
+            response=result["response"],
+            is_complete=True,
+            profile=_profile_from_row(profile),
+            completion_message=_COMPLETION_ANIMATION,
+        )
+
+    return OnboardingResponse.model_construct(
+        session_id=session_key,
+        success=True,
+        response=result["response"],
+        is_complete=False,
     )
 
-    # Process with LLM
-    result = await process_message(temp_session, request.answer)
 
-    logger.info(">> LLM RESULT:")
-    logger.info(f"Response: {result['response']}")
-    logger.info(f"Extracted: {result['extracted']}")
-    logger.info(f"Is complete: {result.get('is_complete', False)}")
+def _sse(data: dict, event: Optional[str] = None) -> bytes:
+    """One Server-Sent Events frame with a JSON payload."""
+    frame = b"data: " + orjson.dumps(data) + b"\n\n"
+    return frame if event is None else b"event: " + event.encode() + b"\n" + frame
 
-    # Add user message to database
-    await db_ops.add_message(
-        db=db,
-        session_id=session_uuid,
-        role="user",
-        content=request.answer
-    )
 
-    # Add LLM response to database
-    await db_ops.add_message(
-        db=db,
-        session_id=session_uuid,
-        role="assistant",
-        content=result["response"]
-    )
+# Streamed turns still running; holds a reference so they aren't garbage-collected
+_STREAM_TURNS: set[asyncio.Task] = set()
 
-    # Update profile with extracted data
-    if result.get('extracted'):
-        await db_ops.update_profile(db, session_uuid, **result['extracted'])
 
-    # Handle completion
-    if result.get("is_complete"):
-        await db_ops.mark_complete(db, session_uuid)
+@app.post("/api/onboarding/answer/stream")
+async def submit_answer_stream(request: AnswerRequest):
+    """
+    Submit an answer and stream the reply as Server-Sent Events.
 
-        # Reload session to get updated profile
-        session = await db_ops.get_session(db, session_uuid)
+    Sends `data: {"delta": ...}` frames as the reply text is generated, then
+    one `event: done` frame with the same payload /answer returns. The turn
+    is written to the DB after the done frame, without holding up the stream.
+    """
+    logger.info(">> STREAM ANSWER REQUEST Session ID: %s", request.session_id)
 
-        return OnboardingResponse(
-            session_id=str(session.session_id),
-            success=True,
-            response=result["response"],
-            is_complete=True,
-            profile=PydanticUserProfile(
-                name=session.profile.name,
-                role=session.profile.role,
-                experience_level=session.profile.experience_level,
-                location=session.profile.location,
-                startup_stage=session.profile.startup_stage,
-                extra_preferences=session.profile.extra_preferences
-            ),
-            completion_message=COMPLETION["animation"],
-        )
+    session_uuid = request.session_id
+    session_key = str(session_uuid)
 
-    return OnboardingResponse(
-        session_id=str(session.session_id),
-        success=True,
-        response=result["response"],
-        is_complete=False,
-    )
+    # Held for the whole turn, past the end of this handler: run_turn releases it
+    lock = session_cache.lock(session_key)
+    await lock.acquire()
+    try:
+        temp_session = await _load_session(session_uuid, session_key)
+    except BaseException:
+        lock.release()
+        raise
+
+    # SSE frames for the response; None ends the stream
+    frames: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+
+    async def run_turn():
+        # Runs in its own task, not in the response body: a client that goes
+        # away mid-stream doesn't cancel it, so the turn is still recorded
+        # and the lock always released
+        recorded = False
+        try:
+            user_task = asyncio.create_task(_insert_user_message(session_uuid, request.answer))
+            try:
+                async for kind, payload in stream_message(temp_session, request.answer):
+                    if kind == "delta":
+                        frames.put_nowait(_sse({"delta": payload}))
+                    else:
+                        result = payload
+                user_appended = await user_task
+            except Exception as e:
+                # Like /answer: the user message INSERT still runs to the end
+                await asyncio.gather(user_task, return_exceptions=True)
+                logger.exception(">> ERROR IN STREAM ANSWER")
+                frames.put_nowait(_sse({"detail": f"Internal server error: {str(e)}"}, event="error"))
+                return
+
+            response = OnboardingResponse.model_construct(
+                session_id=session_key,
+                success=True,
+                response=result["response"],
+                is_complete=bool(result.get("is_complete")),
+            )
+            if response.is_complete:
+                response.profile = _profile_from_row(temp_session.profile)
+                response.completion_message = _COMPLETION_ANIMATION
+            frames.put_nowait(_sse(response.model_dump(), event="done"))
+            frames.put_nowait(None)
+
+            try:
+                await _record_turn(session_uuid, session_key, temp_session, result, user_appended)
+                recorded = True
+            except Exception:
+                logger.exception(">> ERROR RECORDING STREAMED TURN for %s", session_key)
+        finally:
+            if not recorded:
+                # stream_message already mutated the cached copy; don't trust it
+                session_cache.invalidate(session_key)
+            frames.put_nowait(None)  # no-op for the reader if the stream already ended
+            lock.release()
+
+    task = asyncio.create_task(run_turn())
+    _STREAM_TURNS.add(task)
+    task.add_done_callback(_STREAM_TURNS.discard)
+
+    async def event_source():
+        while (frame := await frames.get()) is not None:
+            yield frame
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
 
 
 @app.get("/api/onboarding/session/{session_id}")
@@ -297,30 +471,31 @@ async def get_session_endpoint(session_id: str, db: AsyncSession = Depends(get_d
     """
     Get current session state.
     """
-    import uuid as uuid_module
-    
     try:
-        session_uuid = uuid_module.UUID(session_id)
-        session = await db_ops.get_session(db, session_uuid)
+        session_uuid = UUID(session_id)
+        session = await db_ops.get_session_view(db, session_uuid)
 
         if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        return {
+        body = orjson.dumps({
             "session_id": str(session.session_id),
             "user_id": session.user_id,
             "status": session.status.value,
             "profile": {
-                "name": session.profile.name,
-                "role": session.profile.role,
-                "experience_level": session.profile.experience_level,
-                "location": session.profile.location,
-                "startup_stage": session.profile.startup_stage,
-                "extra_preferences": session.profile.extra_preferences,
+                "name": session.name,
+                "role": session.role,
+                "experience_level": session.experience_level,
+                "location": session.location,
+                "startup_stage": session.startup_stage,
+                "extra_preferences": session.extra_preferences,
             },
-            "conversation_history": session.conversation_history,
             "created_at": session.created_at.isoformat(),
-        }
+        })
+        # The history arrives from Postgres as JSON text; splice it in as-is
+        # rather than decoding and re-encoding the whole list
+        body = b'%s,"conversation_history":%s}' % (body[:-1], session.history_json.encode())
+        return Response(body, media_type="application/json")
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid session ID format")
 